@@ -1,30 +1,83 @@
 """The Windhager myComfort integration."""
+import asyncio
 from datetime import timedelta
 import enum
 import logging
 
-from .mycomfortclient.myComfortGateway import Gateway
-
+import aiohttp
 import voluptuous as vol
 
 from homeassistant.const import (
+    ATTR_ENTITY_ID,
     CONF_HOST,
     CONF_NAME,
     CONF_PASSWORD,
     CONF_PORT,
     CONF_SCAN_INTERVAL,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
 )
-from homeassistant.helpers import discovery
+from homeassistant.core import callback
+from homeassistant.helpers import discovery, entity_registry as er
 import homeassistant.helpers.config_validation as cv
-#from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+import homeassistant.util.dt as dt_util
+
+from .coordinator import TIERS, myComfortCoordinator
+from .gateway import (
+    DEFAULT_CONNECTIONS,
+    DEFAULT_REQUEST_RATE,
+    myComfortAuthError,
+    myComfortGateway,
+    myComfortGatewayError,
+)
+from .history import myComfortHistory
+from .stats import myComfortStats
+from .transport import load_recording, myComfortRecorder, myComfortReplay
 
 MYCOMFORT_PLATFORMS = ["sensor", "climate", "water_heater"]
 
 DOMAIN = "mycomfort"
 MYCOMFORT_ERROR = "error"
 MYCOMFORT_API = "api"
+MYCOMFORT_COORDINATOR = "coordinator"
 MYCOMFORT_NAME = "name"
+MYCOMFORT_SENSOR_TIERS = "sensor_tiers"
+MYCOMFORT_HISTORY = "history"
+
+# Formatted with the gateway name
+SIGNAL_NEW_DEVICES = f"{DOMAIN}_new_devices_{{}}"
+SIGNAL_NEW_DATAPOINTS = f"{DOMAIN}_new_datapoints_{{}}"
+
+EVENT_STATS = f"{DOMAIN}_stats"
+SERVICE_DUMP_STATS = "dump_stats"
+ATTR_GATEWAY = "gateway"
+ATTR_RESTORED = "restored"
+
+EVENT_HISTORY = f"{DOMAIN}_history"
+SERVICE_QUERY_HISTORY = "query_history"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_PERIOD = "period"
+ATTR_BUCKETS = "buckets"
+
+STORAGE_KEY = f"{DOMAIN}.topology"
+STORAGE_VERSION = 1
+
+CONF_REFRESH_TIERS = "refresh_tiers"
+CONF_SENSOR_TIERS = "sensor_tiers"
+CONF_HISTORY = "history"
+CONF_CONNECTIONS = "connections"
+CONF_REQUEST_RATE = "requests_per_second"
+CONF_RECORD = "record"
+CONF_REPLAY = "replay"
+CONF_REPLAY_SPEED = "replay_speed"
+
+# Seconds between two writes of the recorded traffic
+RECORD_FLUSH_INTERVAL = timedelta(seconds=60)
 
 logger = logging.getLogger(__name__)
 #logger.setLevel(logging.DEBUG)
@@ -33,48 +86,273 @@ logger = logging.getLogger(__name__)
 DEFAULT_SCAN_INTERVAL = 60
 SCAN_INTERVAL = timedelta(seconds=DEFAULT_SCAN_INTERVAL)
 
-CONFIG_SCHEMA = vol.Schema(
+GATEWAY_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
-            {
-                vol.Required(CONF_HOST): cv.string,
-                vol.Required(CONF_PORT): cv.string,
-                vol.Required(CONF_USERNAME): cv.string,
-                vol.Required(CONF_PASSWORD): cv.string,
-                vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): vol.All(
-                    cv.time_period, lambda value: value.total_seconds()
-                ),
-                vol.Optional(CONF_NAME, default="myComfort"): cv.string,
-            }
-        )
-    },
+        vol.Required(CONF_HOST): cv.string,
+        vol.Required(CONF_PORT): cv.string,
+        vol.Required(CONF_USERNAME): cv.string,
+        vol.Required(CONF_PASSWORD): cv.string,
+        vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): vol.All(
+            cv.time_period, lambda value: value.total_seconds()
+        ),
+        vol.Optional(CONF_NAME, default="myComfort"): cv.string,
+        vol.Optional(CONF_REFRESH_TIERS, default={}): {
+            vol.In(TIERS): vol.All(cv.time_period, lambda value: value.total_seconds())
+        },
+        vol.Optional(CONF_SENSOR_TIERS, default={}): {cv.string: vol.In(TIERS)},
+        vol.Optional(CONF_HISTORY, default=False): cv.boolean,
+        vol.Optional(CONF_CONNECTIONS, default=DEFAULT_CONNECTIONS): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_REQUEST_RATE, default=DEFAULT_REQUEST_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1)
+        ),
+        vol.Exclusive(CONF_RECORD, "traffic"): cv.string,
+        vol.Exclusive(CONF_REPLAY, "traffic"): cv.string,
+        vol.Optional(CONF_REPLAY_SPEED, default=1.0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
+
+def _unique_names(gateways):
+    """Validate that every gateway has its own name."""
+    names = [gateway[CONF_NAME] for gateway in gateways]
+    if len(set(names)) != len(names):
+        raise vol.Invalid("Each myComfort gateway needs a unique name")
+    return gateways
+
+
+CONFIG_SCHEMA = vol.Schema(
+    {DOMAIN: vol.All(cv.ensure_list, [GATEWAY_SCHEMA], _unique_names)},
     extra=vol.ALLOW_EXTRA,
 )
 
+SERVICE_DUMP_STATS_SCHEMA = vol.Schema({vol.Optional(ATTR_GATEWAY): cv.string})
+
+SERVICE_QUERY_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_id,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+    }
+)
+
 
-def setup(hass, config):
+async def async_setup(hass, config):
     """Create the mycomfort component."""
-    conf = config[DOMAIN]
-    params = {}
+    hass.data[DOMAIN] = {}
 
-    if conf.get(CONF_SCAN_INTERVAL):
-        params["cacheDuration"] = conf.get(CONF_SCAN_INTERVAL) - 1
+    # Every gateway has its own session and coordinator, so they are set up
+    # and polled concurrently
+    results = await asyncio.gather(
+        *(async_setup_gateway(hass, conf, config) for conf in config[DOMAIN])
+    )
+    if not any(results):
+        return False
 
-    params["logginglevel"] = logger.level
+    async def async_dump_stats(call):
+        """Log the request statistics and fire them as an event."""
+        for name, gateway in hass.data[DOMAIN].items():
+            if call.data.get(ATTR_GATEWAY, name) != name:
+                continue
+            stats = {ATTR_GATEWAY: name, **gateway[MYCOMFORT_API].stats.as_dict()}
+            logger.info("myComfort gateway statistics: %s", stats)
+            hass.bus.async_fire(EVENT_STATS, stats)
 
-    try:
-        mycomfort_api = Gateway(conf[CONF_HOST], conf[CONF_PORT], conf[CONF_USERNAME], conf[CONF_PASSWORD], **params)
-    except AttributeError:
-        logger.error(
-            "Failed to create myComfort API client. Please check your credentials"
+    hass.services.async_register(
+        DOMAIN, SERVICE_DUMP_STATS, async_dump_stats, schema=SERVICE_DUMP_STATS_SCHEMA
+    )
+
+    async def async_query_history(call):
+        """Fire the buffered history of a sensor as an event."""
+        entity_id = call.data[ATTR_ENTITY_ID]
+        end = dt_util.as_utc(call.data.get(ATTR_END, dt_util.utcnow()))
+        start = dt_util.as_utc(call.data.get(ATTR_START, end - timedelta(days=1)))
+        for gateway in hass.data[DOMAIN].values():
+            history = gateway[MYCOMFORT_HISTORY]
+            if history is not None and entity_id in history:
+                break
+        else:
+            logger.warning("No myComfort history buffered for %s", entity_id)
+            return
+        period, buckets = history.query(entity_id, start.timestamp(), end.timestamp())
+        hass.bus.async_fire(
+            EVENT_HISTORY,
+            {
+                ATTR_ENTITY_ID: entity_id,
+                ATTR_PERIOD: period,
+                ATTR_BUCKETS: [
+                    [dt_util.utc_from_timestamp(bucket).isoformat(), *values]
+                    for bucket, *values in buckets
+                ],
+            },
         )
-        return False
 
-    hass.data[DOMAIN] = {}
-    hass.data[DOMAIN][MYCOMFORT_API] = mycomfort_api
-    hass.data[DOMAIN][MYCOMFORT_NAME] = conf[CONF_NAME]
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_QUERY_HISTORY,
+        async_query_history,
+        schema=SERVICE_QUERY_HISTORY_SCHEMA,
+    )
+
+    return True
+
+
+async def async_setup_gateway(hass, conf, config):
+    """Set up one myComfort gateway and load its platforms."""
+    name = conf[CONF_NAME]
+    stats = myComfortStats()
+    transport = None
+    if CONF_REPLAY in conf:
+        try:
+            exchanges = await hass.async_add_executor_job(
+                load_recording, hass.config.path(conf[CONF_REPLAY])
+            )
+        except (OSError, ValueError) as err:
+            logger.error("Unable to load the myComfort recording of %s: %s", name, err)
+            return False
+        transport = myComfortReplay(exchanges, conf[CONF_REPLAY_SPEED])
+    # One keep-alive session per gateway, with its connection reuse counted
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=conf[CONF_CONNECTIONS]),
+        trace_configs=[stats.trace_config()],
+    )
+    mycomfort_api = myComfortGateway(
+        session,
+        conf[CONF_HOST],
+        conf[CONF_PORT],
+        conf[CONF_USERNAME],
+        conf[CONF_PASSWORD],
+        connections=conf[CONF_CONNECTIONS],
+        stats=stats,
+        rate=conf[CONF_REQUEST_RATE],
+        transport=transport,
+    )
+    recorder = None
+    if CONF_RECORD in conf:
+        recorder = myComfortRecorder(hass.config.path(conf[CONF_RECORD]))
+        mycomfort_api.record(recorder)
+    coordinator = myComfortCoordinator(
+        hass,
+        name,
+        mycomfort_api,
+        conf[CONF_SCAN_INTERVAL],
+        conf[CONF_REFRESH_TIERS],
+    )
+
+    store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{slugify(name)}")
+    topology = await store.async_load()
+
+    if topology is None:
+        try:
+            await coordinator.async_discover()
+        except myComfortAuthError:
+            logger.error(
+                "Failed to create myComfort API client for %s. Please check your credentials",
+                name,
+            )
+            await session.close()
+            return False
+        except myComfortGatewayError as err:
+            logger.error("Unable to discover myComfort devices of %s: %s", name, err)
+            await session.close()
+            return False
+        await store.async_save(coordinator.topology())
+        _async_migrate_unique_ids(hass, coordinator)
+        await coordinator.async_refresh()
+    else:
+        # Create the entities from the saved topology right away and check it
+        # against the gateway in the background
+        coordinator.load_topology(topology)
+        _async_migrate_unique_ids(hass, coordinator)
+        hass.async_create_task(async_rediscover(hass, coordinator, store))
+
+    cancel_flush = None
+    # Flushes run in the executor, one at a time so they append in order
+    flush_lock = asyncio.Lock()
+
+    async def async_flush_recording(now=None):
+        async with flush_lock:
+            await hass.async_add_executor_job(recorder.write, recorder.take())
+
+    async def async_close_session(event):
+        await session.close()
+        if recorder is not None:
+            cancel_flush()
+            await async_flush_recording()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_session)
+
+    if recorder is not None:
+        cancel_flush = async_track_time_interval(
+            hass, async_flush_recording, RECORD_FLUSH_INTERVAL
+        )
+
+    hass.data[DOMAIN][name] = {
+        MYCOMFORT_API: mycomfort_api,
+        MYCOMFORT_COORDINATOR: coordinator,
+        MYCOMFORT_NAME: name,
+        MYCOMFORT_SENSOR_TIERS: conf[CONF_SENSOR_TIERS],
+        MYCOMFORT_HISTORY: myComfortHistory() if conf[CONF_HISTORY] else None,
+    }
 
     for platform in MYCOMFORT_PLATFORMS:
-        discovery.load_platform(hass, platform, DOMAIN, {}, config)
+        hass.async_create_task(
+            discovery.async_load_platform(
+                hass, platform, DOMAIN, {MYCOMFORT_NAME: name}, config
+            )
+        )
 
     return True
+
+
+@callback
+def _async_migrate_unique_ids(hass, coordinator):
+    """Namespace unique IDs created before they included the gateway name."""
+    registry = er.async_get(hass)
+    prefixes = tuple(
+        f"{device.serial_no}-" for device in coordinator.boilers + coordinator.modules
+    )
+    for entry in list(registry.entities.values()):
+        if entry.platform == DOMAIN and entry.unique_id.startswith(prefixes):
+            registry.async_update_entity(
+                entry.entity_id, new_unique_id=f"{coordinator.name}-{entry.unique_id}"
+            )
+
+
+async def async_rediscover(hass, coordinator, store):
+    """Refresh the saved topology and add the devices not known yet.
+
+    Known devices are probed again, so the sensors of datapoints they did not
+    report when first discovered are added too.
+    """
+    try:
+        new_boilers, new_modules = await coordinator.async_discover()
+        gained = await coordinator.async_reprobe(
+            [
+                device
+                for device in coordinator.boilers + coordinator.modules
+                if device not in new_boilers + new_modules
+            ]
+        )
+    except myComfortGatewayError as err:
+        logger.warning("Unable to discover myComfort devices, using saved ones: %s", err)
+    else:
+        await store.async_save(coordinator.topology())
+        if new_boilers or new_modules:
+            async_dispatcher_send(
+                hass,
+                SIGNAL_NEW_DEVICES.format(coordinator.name),
+                new_boilers,
+                new_modules,
+            )
+        if gained:
+            async_dispatcher_send(
+                hass,
+                SIGNAL_NEW_DATAPOINTS.format(coordinator.name),
+                [device for device in gained if device in coordinator.boilers],
+                [device for device in gained if device in coordinator.modules],
+            )
+    await coordinator.async_refresh()
@@ -0,0 +1,73 @@
+"""Incremental alarm feed of the Windhager myComfort boilers."""
+from collections import deque
+import logging
+
+import homeassistant.util.dt as dt_util
+
+from .gateway import myComfortNotSupportedError
+
+logger = logging.getLogger(__name__)
+
+EVENT_ALARM = "mycomfort_alarm"
+
+# Alarms kept in memory per boiler
+ALARM_LOG_SIZE = 20
+
+
+class myComfortAlarmFeed:
+    """Follow the error history of a boiler with a cursor on its error counter.
+
+    Only the entries logged after the cursor are fetched. The history found
+    at the first update fills the log without being reported as new.
+
+    Boilers whose gateway does not serve the error history only report their
+    current alarm text: a growing counter then gives a single alarm, with
+    that text.
+    """
+
+    __slots__ = ("cursor", "log", "history")
+
+    def __init__(self):
+        """Initialize an empty feed."""
+        self.cursor = None
+        self.log = deque(maxlen=ALARM_LOG_SIZE)
+        self.history = True
+
+    async def async_update(self, boiler, count):
+        """Fetch the entries up to an error count, returning the new alarms."""
+        if self.cursor is None:
+            for number, text in await self._entries(boiler, 1, count, False):
+                self.log.append({"number": number, "alarm": text, "time": None})
+            self.cursor = count
+            return []
+        if count == self.cursor:
+            return []
+        if count < self.cursor:
+            # The error history was cleared on the boiler
+            self.cursor = 0
+        now = dt_util.utcnow().isoformat()
+        alarms = [
+            {"number": number, "alarm": text, "time": now}
+            for number, text in await self._entries(boiler, self.cursor + 1, count)
+        ]
+        self.cursor = count
+        self.log.extend(alarms)
+        return alarms
+
+    async def _entries(self, boiler, first, last, current=True):
+        """Return the entries first to last, or the current alarm without a history."""
+        if self.history:
+            try:
+                return await boiler.errors(first, last)
+            except myComfortNotSupportedError:
+                logger.info(
+                    "No error history on %s, following its alarm text", boiler.name
+                )
+                self.history = False
+        if not current or first > last:
+            return []
+        await boiler.refresh(["getAlarmText"])
+        try:
+            return [(last, boiler.get("getAlarmText"))]
+        except ValueError:
+            return [(last, None)]
@@ -0,0 +1,276 @@
+"""Poll-cycle benchmark of the myComfort integration against the simulator.
+
+Sets up the sensor, climate and water_heater platforms in a throw-away Home
+Assistant instance pointed at a local simulated gateway, runs a number of
+poll cycles and reports, per scenario:
+
+- gateway requests per cycle over all gateways, with simulated time advancing one update
+  interval per cycle so refresh tiers behave as in production
+- state writes per cycle
+- wall time per cycle
+- executor thread occupancy during the cycles
+- memory allocated per entity during setup
+
+    python -m custom_components.mycomfort.bench.benchmark --cycles 20
+    python -m custom_components.mycomfort.bench.benchmark --save baseline.json
+    python -m custom_components.mycomfort.bench.benchmark --compare baseline.json
+
+With --replay, a single "replay" scenario answers from traffic recorded from a
+real gateway instead of the simulator, with the recorded latencies divided by
+--speed.
+
+    python -m custom_components.mycomfort.bench.benchmark --replay traffic.jsonl.gz
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from homeassistant import bootstrap, config_entries
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from .. import (
+    DOMAIN,
+    MYCOMFORT_API,
+    MYCOMFORT_COORDINATOR,
+    coordinator as coordinator_module,
+)
+from .simulator import myComfortSimulator
+
+# name: (gateways, boilers, modules, dhw, latency, error rate)
+SCENARIOS = {
+    "small": (1, 1, 2, 1, 0.0, 0.0),
+    "large": (1, 2, 5, 1, 0.0, 0.0),
+    "large_slow": (1, 2, 5, 1, 0.05, 0.0),
+    "large_flaky": (1, 2, 5, 1, 0.01, 0.05),
+    "multi_slow": (3, 2, 5, 1, 0.05, 0.0),
+}
+
+
+class _SimulatedClock:
+    """Monotonic clock advanced by one update interval per simulated cycle."""
+
+    def __init__(self):
+        """Initialize the clock at the current time."""
+        self.now = time.monotonic()
+
+    def monotonic(self):
+        """Return the simulated time."""
+        return self.now
+
+
+USERNAME = "Service"
+PASSWORD = "bench"
+
+
+async def _run_scenario(name, cycles, rate=None, replay=None, speed=1.0):
+    with tempfile.TemporaryDirectory(prefix="mycomfort-bench-") as config_dir:
+        return await _run_in(config_dir, name, cycles, rate, replay, speed)
+
+
+async def _run_in(config_dir, name, cycles, rate, replay, speed):
+    if replay:
+        simulators = []
+        servers = []
+        gateway_confs = [
+            {
+                "host": "replay",
+                "port": "0",
+                "username": USERNAME,
+                "password": PASSWORD,
+                "replay": os.path.abspath(replay),
+                "replay_speed": speed,
+            }
+        ]
+    else:
+        gateways, boilers, modules, dhw, latency, error_rate = SCENARIOS[name]
+        simulators = [
+            myComfortSimulator(
+                boilers, modules, dhw, latency, 0.0, error_rate, USERNAME, PASSWORD
+            )
+            for _ in range(gateways)
+        ]
+        servers = [await simulator.start() for simulator in simulators]
+        gateway_confs = [
+            {
+                "host": "127.0.0.1",
+                "port": str(port),
+                "username": USERNAME,
+                "password": PASSWORD,
+            }
+            for _, port in servers
+        ]
+
+    hass = HomeAssistant()
+    hass.config.config_dir = config_dir
+    hass.config.skip_pip = True
+    busy = [0.0]
+    _measure_executor(hass, busy)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await bootstrap.load_registries(hass)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await async_setup_component(
+        hass,
+        DOMAIN,
+        {
+            DOMAIN: [
+                {
+                    **conf,
+                    "name": f"myComfort {index + 1}",
+                    **({"requests_per_second": rate} if rate else {}),
+                }
+                for index, conf in enumerate(gateway_confs)
+            ]
+        },
+    )
+    await hass.async_block_till_done()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    entities = [
+        state
+        for state in hass.states.async_all()
+        if state.domain in ("sensor", "climate", "water_heater")
+    ]
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    coordinators = [
+        gateway[MYCOMFORT_COORDINATOR] for gateway in hass.data[DOMAIN].values()
+    ]
+    apis = [gateway[MYCOMFORT_API] for gateway in hass.data[DOMAIN].values()]
+    clock = _SimulatedClock()
+    state_writes = [0]
+
+    def count_state_write(event):
+        state_writes[0] += 1
+
+    hass.bus.async_listen(EVENT_STATE_CHANGED, count_state_write)
+    requests = []
+    durations = []
+    busy[0] = 0.0
+    started = time.perf_counter()
+    with patch.object(coordinator_module, "time", clock):
+        for _ in range(cycles):
+            clock.now += coordinators[0].update_interval.total_seconds()
+            count = _total_requests(simulators, apis)
+            cycle_started = time.perf_counter()
+            await asyncio.gather(
+                *(coordinator.async_refresh() for coordinator in coordinators)
+            )
+            await hass.async_block_till_done()
+            durations.append(time.perf_counter() - cycle_started)
+            requests.append(_total_requests(simulators, apis) - count)
+    elapsed = time.perf_counter() - started
+    await hass.async_block_till_done()
+    writes = state_writes[0]
+
+    await hass.async_stop(force=True)
+    for runner, _ in servers:
+        await runner.cleanup()
+
+    return {
+        "entities": len(entities),
+        "requests_per_cycle": statistics.mean(requests),
+        "state_writes_per_cycle": writes / cycles,
+        "wall_time_per_cycle_ms": statistics.mean(durations) * 1000,
+        "wall_time_p95_ms": sorted(durations)[math.ceil(len(durations) * 0.95) - 1]
+        * 1000,
+        "executor_occupancy": busy[0] / elapsed if elapsed else 0.0,
+        "memory_per_entity_kb": allocated / max(len(entities), 1) / 1024,
+        "injected_errors": sum(simulator.errors for simulator in simulators),
+    }
+
+
+def _total_requests(simulators, apis):
+    if not simulators:
+        # Replayed traffic has no simulator counting the requests it answers
+        return sum(api.stats.requests for api in apis)
+    return sum(simulator.total_requests for simulator in simulators)
+
+
+def _measure_executor(hass, busy):
+    """Accumulate the time spent in executor jobs."""
+    add_executor_job = hass.async_add_executor_job
+
+    def timed(target, *args):
+        def run():
+            started = time.perf_counter()
+            try:
+                return target(*args)
+            finally:
+                busy[0] += time.perf_counter() - started
+
+        return add_executor_job(run)
+
+    hass.async_add_executor_job = timed
+
+
+def _report(results, baseline=None):
+    columns = [
+        "entities",
+        "requests_per_cycle",
+        "state_writes_per_cycle",
+        "wall_time_per_cycle_ms",
+        "wall_time_p95_ms",
+        "executor_occupancy",
+        "memory_per_entity_kb",
+    ]
+    for name, result in results.items():
+        print(f"{name}:")
+        for column in columns:
+            line = f"  {column:<24} {result[column]:>10.2f}"
+            if baseline and name in baseline:
+                previous = baseline[name].get(column)
+                if previous:
+                    line += f"  ({(result[column] - previous) / previous:+.1%})"
+            print(line)
+
+
+def main():
+    """Run the benchmark scenarios."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument(
+        "--rate", type=float, help="requests per second budget of each gateway"
+    )
+    parser.add_argument("--replay", help="recorded traffic to replay")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay speed, 0 for no latency"
+    )
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="compare with results saved earlier")
+    args = parser.parse_args()
+
+    results = {}
+    if args.replay:
+        results["replay"] = asyncio.run(
+            _run_scenario("replay", args.cycles, args.rate, args.replay, args.speed)
+        )
+    for name in args.scenario or ([] if args.replay else SCENARIOS):
+        results[name] = asyncio.run(_run_scenario(name, args.cycles, args.rate))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    _report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
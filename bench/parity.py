@@ -0,0 +1,89 @@
+"""Check the datapoint table of the client against a real gateway.
+
+The addresses in DATAPOINTS and the labels of DATAPOINTS_ENUM are not read
+from the gateway, and the simulator is generated from the same table, so the
+benchmark cannot catch a wrong one. This check replays traffic recorded from
+a real gateway (see `record` in the README) through the client and reports,
+for every boiler and module found in the recording:
+
+- catalog datapoints whose address was not answered
+- values that do not decode as their datapoint expects, e.g. an enum index
+  without a label or a number that is not one
+
+With --unmapped, it also lists the OIDs answered by the gateway that no
+datapoint maps, to find the right address of a missing one.
+
+Record from a fresh start, without a saved topology in .storage, so the
+discovery probe reads every datapoint of the catalog once.
+
+    python -m custom_components.mycomfort.bench.parity mycomfort.jsonl.gz --unmapped
+"""
+import argparse
+import asyncio
+import sys
+
+from ..gateway import (
+    DATAPOINTS,
+    ERROR_HISTORY,
+    MYCOMFORT_SUBNET,
+    TIME_PROGRAMS,
+    myComfortGateway,
+)
+from ..transport import load_recording, myComfortReplay
+
+
+async def check(path, unmapped=False):
+    """Return the problems found in a recording, one line each."""
+    replay = myComfortReplay(load_recording(path), speed=0)
+    gateway = myComfortGateway(None, "replay", 0, "", "", transport=replay)
+    boilers, modules = await gateway.discover()
+    if not boilers + modules:
+        return [f"No boiler or module found in {path}"]
+
+    problems = []
+    for device in boilers + modules:
+        await device.probe()
+        mapped = {device.oid(datapoint) for datapoint in DATAPOINTS}
+        implausible = device.implausible(device.datapoints)
+        for datapoint in device.catalog:
+            oid = device.oid(datapoint)
+            if datapoint not in device.datapoints:
+                problems.append(f"{device.name}: {datapoint} ({oid}) not answered")
+            elif datapoint in implausible:
+                problems.append(f"{device.name}: {datapoint} ({oid}) {implausible[datapoint]}")
+        if unmapped:
+            problems += [
+                f"{device.name}: {oid} is not mapped"
+                for oid in sorted(device._table)  # pylint: disable=protected-access
+                if oid not in mapped and not _structured(device, oid)
+            ]
+    return problems
+
+
+def _structured(device, oid):
+    """Return True if an OID belongs to the error history or a weekly program."""
+    function = f"/{MYCOMFORT_SUBNET}/{device.node_id}/{device.fct_id}/"
+    return any(
+        oid.startswith(f"{function}{level}/") for level in [ERROR_HISTORY, *TIME_PROGRAMS]
+    )
+
+
+def main():
+    """Check a recording and exit with an error if anything does not match."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="traffic recorded from a real gateway")
+    parser.add_argument(
+        "--unmapped", action="store_true", help="list the OIDs no datapoint maps"
+    )
+    args = parser.parse_args()
+
+    problems = asyncio.run(check(args.recording, args.unmapped))
+    for problem in problems:
+        print(problem)
+    if any(not problem.endswith("is not mapped") for problem in problems):
+        sys.exit(1)
+    print("Every datapoint of the recording matches the table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Check the ordering, merging and request budget of the gateway scheduler.
+
+Runs the scheduler against requests that only record when they start, and
+reports any request started out of priority order, a duplicate read sent
+twice or not promoted to the priority of a more urgent duplicate, and starts
+closer together than the request rate allows.
+
+    python -m custom_components.mycomfort.bench.scheduler
+"""
+import asyncio
+import sys
+import time
+
+from ..scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_WRITE,
+    myComfortScheduler,
+)
+from ..stats import myComfortStats
+
+RATE = 20
+
+
+class _Requests:
+    """Requests recording their start, held until released."""
+
+    def __init__(self):
+        """Initialize with no request started."""
+        self.started = []
+        self.released = asyncio.Event()
+
+    def send(self, name):
+        """Return a request coroutine function named for the log."""
+
+        async def request():
+            self.started.append((name, time.monotonic()))
+            await self.released.wait()
+            return name
+
+        return request
+
+
+async def _ordering():
+    """Requests queued behind a running one start by priority, then in order."""
+    scheduler = myComfortScheduler(1)
+    requests = _Requests()
+    running = asyncio.ensure_future(
+        scheduler.run(requests.send("running"), PRIORITY_BACKGROUND)
+    )
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.ensure_future(scheduler.run(requests.send(name), priority))
+        for name, priority in [
+            ("background 1", PRIORITY_BACKGROUND),
+            ("background 2", PRIORITY_BACKGROUND),
+            ("interactive", PRIORITY_INTERACTIVE),
+            ("write", PRIORITY_WRITE),
+        ]
+    ]
+    await asyncio.sleep(0)
+    requests.released.set()
+    await asyncio.gather(running, *queued)
+    order = [name for name, _ in requests.started]
+    expected = ["running", "write", "interactive", "background 1", "background 2"]
+    if order != expected:
+        return [f"Started {order} instead of {expected}"]
+    return []
+
+
+async def _merging():
+    """A read queued twice is sent once, at the most urgent priority."""
+    stats = myComfortStats()
+    scheduler = myComfortScheduler(1, stats=stats)
+    requests = _Requests()
+    running = asyncio.ensure_future(
+        scheduler.run(requests.send("running"), PRIORITY_BACKGROUND)
+    )
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.ensure_future(scheduler.run(requests.send(name), priority, key))
+        for name, priority, key in [
+            ("other background", PRIORITY_BACKGROUND, "other"),
+            ("lookup", PRIORITY_BACKGROUND, "lookup"),
+            ("interactive", PRIORITY_INTERACTIVE, "interactive"),
+            ("lookup again", PRIORITY_INTERACTIVE, "lookup"),
+        ]
+    ]
+    await asyncio.sleep(0)
+    requests.released.set()
+    results = await asyncio.gather(running, *queued)
+    problems = []
+    order = [name for name, _ in requests.started]
+    expected = ["running", "lookup", "interactive", "other background"]
+    if order != expected:
+        problems.append(f"Started {order} instead of {expected}")
+    if results[2] != results[4]:
+        problems.append(f"Merged read answered {results[4]} instead of {results[2]}")
+    if stats.merged != 1:
+        problems.append(f"Counted {stats.merged} merged reads instead of 1")
+    return problems
+
+
+async def _budget():
+    """Requests start at most RATE times per second, whatever the concurrency."""
+    scheduler = myComfortScheduler(10, RATE)
+    requests = _Requests()
+    requests.released.set()
+    await asyncio.gather(
+        *(
+            scheduler.run(requests.send(f"request {index}"), PRIORITY_BACKGROUND)
+            for index in range(10)
+        )
+    )
+    starts = [started for _, started in requests.started]
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    # A little slack for the resolution of the event loop timers
+    if min(gaps) < 0.9 / RATE:
+        return [f"Requests started {min(gaps):.3f} s apart at {RATE} per second"]
+    return []
+
+
+async def check():
+    """Return the problems found, one line each."""
+    problems = []
+    for scenario in (_ordering, _merging, _budget):
+        problems += await scenario()
+    return problems
+
+
+def main():
+    """Run the checks and exit with an error if any failed."""
+    problems = asyncio.run(check())
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("The scheduler orders, merges and paces requests as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Local stand-in for a Windhager myComfort gateway.
+
+Serves the lookup and datapoint API used by the integration for a
+configurable number of boilers, heating modules and DHW circuits, with
+optional digest authentication with expiring nonces, injected latency and
+injected errors.
+
+    python -m custom_components.mycomfort.bench.simulator --boilers 2 --modules 5
+"""
+import argparse
+import asyncio
+from collections import Counter
+import hashlib
+import os
+import random
+import re
+import time
+
+from aiohttp import web
+
+from ..gateway import (
+    API_DATAPOINT,
+    API_DATAPOINTS,
+    API_LOOKUP,
+    DATAPOINTS,
+    ERROR_HISTORY,
+    ERROR_HISTORY_SIZE,
+    FCT_TYPE_BOILER,
+    FCT_TYPE_DHW_CIRCUIT,
+    FCT_TYPE_HEATING_CIRCUIT,
+    MYCOMFORT_SUBNET,
+    TIME_PROGRAM_PERIODS,
+    TIME_PROGRAMS,
+)
+
+# Values reported by a simulated boiler and heating module
+SIM_BOILER = {
+    "getBoilerTemperature": lambda: round(random.uniform(55, 75), 1),
+    "getBoilerSetpointTemperature": lambda: 70.0,
+    "getBurnerModulation": lambda: random.randint(0, 100),
+    "getExhaustTemperature": lambda: round(random.uniform(80, 140), 1),
+    "getBufferTemperature": lambda: round(random.uniform(40, 60), 1),
+    "getAlarmText": lambda: "No alarm",
+    "getBurnerStarts": lambda: 12034,
+    "getBurnerHours": lambda: 8123,
+    "getBoilerConsumptionBulkfill": lambda: 1.234,
+    "getBoilerConsumptionTotal": lambda: 45.678,
+    "getOperatingTimeCleaning": lambda: 12,
+    "getOperatingTimeMainCleaning": lambda: 340,
+    "getOperatingTimeMaintenance": lambda: 1200,
+    "getErrorCount": lambda: 0,
+}
+
+SIM_MODULE = {
+    "getOutsideTemperature": lambda: round(random.uniform(-5, 15), 1),
+    "getFlowTemperature": lambda: round(random.uniform(30, 50), 1),
+    "getFlowSetpointTemperature": lambda: 45.0,
+    "getRoomTemperatureSetpoint": lambda: 21.0,
+    # Burners switch on and off every ten minutes rather than on every read
+    "getBurnerActive": lambda: int(time.time() // 600) % 2,
+    "getOperationMode": lambda: 1,
+    "getActiveProgram": lambda: 1,
+    "getDuration": lambda: 0,
+}
+
+SIM_DHW = {
+    "getDHWTemperature": lambda: round(random.uniform(45, 55), 1),
+    "getDHWSetpointTemperature": lambda: 50.0,
+}
+
+# Periods of the simulated weekly programs, as start and end minutes per weekday
+SIM_SCHEDULE = [[360, 480, 960, 1320]] * 5 + [[420, 1380]] * 2
+
+SIM_REALM = "myComfort"
+
+
+class myComfortSimulator:
+    """Simulated gateway keeping its datapoints in memory."""
+
+    def __init__(
+        self,
+        boilers=1,
+        modules=2,
+        dhw=1,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        username=None,
+        password=None,
+        nonce_lifetime=None,
+    ):
+        """Initialize the simulator and its topology."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.username = username
+        self.password = password
+        self.nonce_lifetime = nonce_lifetime
+        self.requests = Counter()
+        self.errors = 0
+        self.nodes = []
+        self.functions = {}
+        self.datapoints = {}
+        self._nonce = os.urandom(8).hex()
+        self._nonce_issued = time.monotonic()
+
+        for index in range(boilers):
+            self._add(20 + index, f"Boiler {index + 1}", FCT_TYPE_BOILER, SIM_BOILER)
+        for index in range(modules):
+            if index < dhw:
+                self._add(
+                    40 + index,
+                    f"DHW circuit {index + 1}",
+                    FCT_TYPE_DHW_CIRCUIT,
+                    {**SIM_MODULE, **SIM_DHW},
+                )
+            else:
+                self._add(
+                    40 + index,
+                    f"Heating circuit {index + 1}",
+                    FCT_TYPE_HEATING_CIRCUIT,
+                    SIM_MODULE,
+                )
+                self._add_time_programs(40 + index)
+
+    def _add(self, node_id, name, fct_type, values):
+        self.nodes.append(
+            {"nodeId": node_id, "name": name, "serialNo": f"SIM{node_id:04d}"}
+        )
+        self.functions[node_id] = [{"fctId": 0, "fctType": fct_type, "name": name}]
+        for datapoint, value in values.items():
+            oid = f"/{MYCOMFORT_SUBNET}/{node_id}/0/{DATAPOINTS[datapoint]}"
+            self.datapoints[oid] = value
+
+    def raise_alarm(self, node_id, text):
+        """Log an error in the history of a boiler and show it as its alarm."""
+        base = f"/{MYCOMFORT_SUBNET}/{node_id}/0/"
+        count = int(self._value(base + DATAPOINTS["getErrorCount"])) + 1
+        self.datapoints[base + DATAPOINTS["getErrorCount"]] = lambda: count
+        self.datapoints[
+            f"{base}{ERROR_HISTORY}/{(count - 1) % ERROR_HISTORY_SIZE}"
+        ] = lambda: text
+        self.datapoints[base + DATAPOINTS["getAlarmText"]] = lambda: text
+
+    def _add_time_programs(self, node_id):
+        for level in TIME_PROGRAMS:
+            for day, minutes in enumerate(SIM_SCHEDULE):
+                minutes = minutes + [0] * (TIME_PROGRAM_PERIODS * 2 - len(minutes))
+                for instance, minute in enumerate(minutes):
+                    oid = f"/{MYCOMFORT_SUBNET}/{node_id}/0/{level}/{day}/{instance}"
+                    self.datapoints[oid] = lambda minute=minute: minute
+
+    @property
+    def total_requests(self):
+        """Return the number of requests served so far."""
+        return sum(self.requests.values())
+
+    def app(self):
+        """Return the aiohttp application serving the gateway API."""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get(API_LOOKUP + "{path:.*}", self._lookup)
+        app.router.add_get(API_DATAPOINT + "{oid:/.*}", self._read)
+        app.router.add_put(API_DATAPOINT, self._write)
+        app.router.add_put(API_DATAPOINTS, self._write_many)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests[request.method] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if (
+            self.nonce_lifetime is not None
+            and time.monotonic() - self._nonce_issued > self.nonce_lifetime
+        ):
+            self._nonce = os.urandom(8).hex()
+            self._nonce_issued = time.monotonic()
+        if self.username is not None and not self._authorized(request):
+            return web.Response(
+                status=401,
+                headers={
+                    "WWW-Authenticate": (
+                        f'Digest realm="{SIM_REALM}", nonce="{self._nonce}", qop="auth"'
+                    )
+                },
+            )
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500)
+        return await handler(request)
+
+    def _authorized(self, request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Digest "):
+            return False
+        params = dict(re.findall(r'(\w+)="?([^",]+)"?', header))
+        if params.get("nonce") != self._nonce:
+            return False
+        ha1 = _md5(f"{self.username}:{SIM_REALM}:{self.password}")
+        ha2 = _md5(f"{request.method}:{params.get('uri')}")
+        expected = _md5(
+            f"{ha1}:{self._nonce}:{params.get('nc')}:{params.get('cnonce')}:auth:{ha2}"
+        )
+        return params.get("response") == expected
+
+    def _value(self, oid):
+        return str(self.datapoints[oid]())
+
+    async def _lookup(self, request):
+        parts = [part for part in request.match_info["path"].split("/") if part]
+        if len(parts) == 1:
+            return web.json_response(self.nodes)
+        if len(parts) == 2:
+            return web.json_response(self.functions.get(int(parts[1]), []))
+        prefix = "/" + "/".join(parts) + "/"
+        return web.json_response(
+            [
+                {"OID": oid, "value": self._value(oid)}
+                for oid in self.datapoints
+                if oid.startswith(prefix)
+            ]
+        )
+
+    async def _read(self, request):
+        oid = request.match_info["oid"]
+        if oid not in self.datapoints:
+            return web.Response(status=404)
+        return web.json_response({"OID": oid, "value": self._value(oid)})
+
+    async def _write(self, request):
+        return self._set([await request.json()])
+
+    async def _write_many(self, request):
+        return self._set(await request.json())
+
+    def _set(self, payload):
+        if any(item["OID"] not in self.datapoints for item in payload):
+            return web.Response(status=404)
+        for item in payload:
+            self.datapoints[item["OID"]] = lambda value=item["value"]: value
+        return web.Response(status=200)
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving, returning the runner and the bound port."""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        return runner, runner.addresses[0][1]
+
+
+def _md5(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def main():
+    """Run the simulator until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--boilers", type=int, default=1)
+    parser.add_argument("--modules", type=int, default=2)
+    parser.add_argument("--dhw", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--nonce-lifetime", type=float, help="seconds")
+    args = parser.parse_args()
+
+    simulator = myComfortSimulator(
+        args.boilers,
+        args.modules,
+        args.dhw,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.username,
+        args.password,
+        args.nonce_lifetime,
+    )
+    web.run_app(simulator.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
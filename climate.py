@@ -1,10 +1,13 @@
 """windhager myComfort climate device."""
 import logging
+import re
 
-import requests
+import voluptuous as vol
 
 from homeassistant.components.climate import ClimateEntity
 from homeassistant.components.climate.const import (
+    ATTR_CURRENT_TEMPERATURE,
+    ATTR_HVAC_ACTION,
     CURRENT_HVAC_HEAT,
     CURRENT_HVAC_IDLE,
     HVAC_MODE_AUTO,
@@ -15,13 +18,34 @@ from homeassistant.components.climate.const import (
     SUPPORT_PRESET_MODE,
     SUPPORT_TARGET_TEMPERATURE,
 )
-from homeassistant.const import ATTR_TEMPERATURE, PRECISION_TENTHS, TEMP_CELSIUS
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_TEMPERATURE,
+    PRECISION_TENTHS,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    TEMP_CELSIUS,
+)
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_platform import async_get_current_platform
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import (
+    ATTR_RESTORED,
     DOMAIN as MYCOMFORT_DOMAIN,
-    MYCOMFORT_ERROR,
-    MYCOMFORT_API,
+    MYCOMFORT_COORDINATOR,
     MYCOMFORT_NAME,
+    SIGNAL_NEW_DEVICES,
+)
+from .gateway import (
+    TIME_PROGRAM_PERIODS,
+    TIME_PROGRAMS,
+    WEEKDAYS,
+    myComfortGatewayError,
 )
 
 logger = logging.getLogger(__name__)
@@ -71,6 +95,35 @@ MYCOMFORT_HOLD_MODE_OFF = "off"
 MYCOMFORT_TEMP_HEATING_MIN = 6
 MYCOMFORT_TEMP_HEATING_MAX = 30
 
+# Datapoints shown by a climate entity
+MYCOMFORT_CLIMATE_DATAPOINTS = [
+    "getFlowTemperature",
+    "getActiveProgram",
+    "getRoomTemperatureSetpoint",
+    "getOperationMode",
+    "getBurnerActive",
+]
+
+# Minutes a setpoint set from Home Assistant stays active
+MYCOMFORT_SETPOINT_DURATION = 60
+# Seconds from the first of a burst of setpoints until the last one is sent to
+# the gateway; the timer is not restarted, so a long drag sends one every 2 s
+MYCOMFORT_SETPOINT_DEBOUNCE = 2
+
+EVENT_SCHEDULE = f"{MYCOMFORT_DOMAIN}_schedule"
+SERVICE_READ_SCHEDULE = "read_schedule"
+SERVICE_WRITE_SCHEDULE = "write_schedule"
+ATTR_PROGRAM = "program"
+ATTR_REFRESH = "refresh"
+ATTR_SCHEDULE = "schedule"
+
+# Weekly program followed in each operation mode
+MYCOMFORT_MODE_PROGRAMS = {
+    MYCOMFORT_MODE_HEATING_1: 1,
+    MYCOMFORT_MODE_HEATING_2: 2,
+    MYCOMFORT_MODE_HEATING_3: 3,
+}
+
 SUPPORT_FLAGS_HEATING = SUPPORT_TARGET_TEMPERATURE | SUPPORT_PRESET_MODE
 
 MYCOMFORT_TO_HA_HVAC_HEATING = {
@@ -100,49 +153,185 @@ HA_TO_MYCOMFORT_PRESET_HEATING = {
 }
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+def _period(value):
+    """Validate a "HH:MM-HH:MM" period of a weekly program."""
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})", cv.string(value))
+    if match is None:
+        raise vol.Invalid(f"Invalid period {value}, expected HH:MM-HH:MM")
+    start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+    start = start_hour * 60 + start_minute
+    end = end_hour * 60 + end_minute
+    if start_minute > 59 or end_minute > 59 or not start < end <= 1440:
+        raise vol.Invalid(f"Invalid period {value}")
+    return value
+
+
+SCHEDULE_PROGRAM = vol.All(vol.Coerce(int), vol.Range(min=1, max=len(TIME_PROGRAMS)))
+
+SCHEDULE_SCHEMA = vol.Schema(
+    {
+        vol.In(WEEKDAYS): vol.All(
+            cv.ensure_list, [_period], vol.Length(max=TIME_PROGRAM_PERIODS)
+        )
+    }
+)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Create the myComfort climate devices."""
     if discovery_info is None:
         return
-    mycomfort_api = hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_API]
-
-    for module in mycomfort_api.modules():
-        add_entities(
+    gateway = hass.data[MYCOMFORT_DOMAIN][discovery_info[MYCOMFORT_NAME]]
+    coordinator = gateway[MYCOMFORT_COORDINATOR]
+    name = gateway[MYCOMFORT_NAME]
+
+    @callback
+    def async_add_devices(boilers, modules):
+        """Add the climate devices of heating modules."""
+        async_add_entities(
             [
                 myComfortClimate(
-                    f"{hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_NAME]} " + module.name,
+                    f"{name} " + module.name,
+                    coordinator,
                     module,
                 )
+                for module in modules
             ]
         )
 
-
-class myComfortClimate(ClimateEntity):
+    async_add_devices(coordinator.boilers, coordinator.modules)
+    async_dispatcher_connect(hass, SIGNAL_NEW_DEVICES.format(name), async_add_devices)
+
+    platform = async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_READ_SCHEDULE,
+        {
+            vol.Required(ATTR_PROGRAM): SCHEDULE_PROGRAM,
+            vol.Optional(ATTR_REFRESH, default=False): cv.boolean,
+        },
+        "async_read_schedule",
+    )
+    platform.async_register_entity_service(
+        SERVICE_WRITE_SCHEDULE,
+        {
+            vol.Required(ATTR_PROGRAM): SCHEDULE_PROGRAM,
+            vol.Required(ATTR_SCHEDULE): SCHEDULE_SCHEMA,
+        },
+        "async_write_schedule",
+    )
+
+
+class myComfortClimate(CoordinatorEntity, RestoreEntity, ClimateEntity):
     """Representation of the myComfort heating climate device."""
 
-    def __init__(self, name, api):
+    def __init__(self, name, coordinator, api):
         """Initialize the climate device."""
+        super().__init__(coordinator)
         self._name = name
         self._state = None
         self._api = api
         self._attributes = {}
         self._target_temperature = None
         self._current_mode = None
+        self._published = None
         self._current_temperature = None
         self._current_program = None
+        self._snapshot = None
         self._current_action = None
+        self._pending_setpoint = None
+        self._setpoint_debouncer = None
+        self._restored = False
+
+    async def async_added_to_hass(self):
+        """Add the datapoints to the fetch plan and read the current snapshot."""
+        await super().async_added_to_hass()
+        self._setpoint_debouncer = Debouncer(
+            self.hass,
+            logger,
+            cooldown=MYCOMFORT_SETPOINT_DEBOUNCE,
+            immediate=False,
+            function=self._async_write_setpoint,
+        )
+        self._update_from_snapshot()
+        if self._current_mode is None:
+            await self._async_restore()
+        self.async_on_remove(
+            self.coordinator.async_want(
+                self._api,
+                MYCOMFORT_CLIMATE_DATAPOINTS,
+                self._restored,
+                interactive=True,
+            )
+        )
+        self._published = self._published_state()
+
+    async def _async_restore(self):
+        """Show the state saved before the restart until the first fetch."""
+        last_state = await self.async_get_last_state()
+        if last_state is None or last_state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return
+        attributes = last_state.attributes
+        self._current_temperature = attributes.get(ATTR_CURRENT_TEMPERATURE)
+        self._target_temperature = attributes.get(ATTR_TEMPERATURE)
+        self._current_program = attributes.get("active_mycomfort_program")
+        self._current_mode = attributes.get("active_mycomfort_mode")
+        self._current_action = attributes.get(ATTR_HVAC_ACTION) == CURRENT_HVAC_HEAT
+        self._attributes = {
+            "active_mycomfort_program": self._current_program,
+            "active_mycomfort_mode": self._current_mode,
+        }
+        self._restored = True
+
+    async def async_will_remove_from_hass(self):
+        """Drop a setpoint still waiting to be written."""
+        await super().async_will_remove_from_hass()
+        self._setpoint_debouncer.async_cancel()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Publish the coordinator snapshot if anything shown changed."""
+        self._update_from_snapshot()
+        published = self._published_state()
+        if published != self._published:
+            self._published = published
+            self.async_write_ha_state()
+
+    def _published_state(self):
+        """Return the values shown by the entity."""
+        return (
+            self.coordinator.available(self._api),
+            self._current_temperature,
+            self._target_temperature,
+            self._current_mode,
+            self._current_program,
+            self._current_action,
+            self._restored,
+        )
 
-    def update(self):
-        try:
-            self._current_temperature = float(self._api.getFlowTemperature())
+    def _update_from_snapshot(self):
+        data = self.coordinator.snapshot(self._api)
+        # Snapshots are decoded once and only replaced when a value changed
+        if data is self._snapshot:
+            return
+        if not self.coordinator.fetched(self._api, MYCOMFORT_CLIMATE_DATAPOINTS):
+            logger.debug("No data from myComfort server yet for %s", self._name)
+            return
+        self._snapshot = data
+        # Values not reported as numbers, e.g. of a failed sensor, are None
 
-            self._current_program = self._api.getActiveProgram()
+        self._current_temperature = data.get("getFlowTemperature")
 
-            self._target_temperature = float(self._api.getRoomTemperatureSetpoint())
+        program = data.get("getActiveProgram")
 
-            self._current_mode = self._api.getOperationMode()
-            logger.debug(self._name + " current mode : " + self._current_mode)
-            # Update the generic device attributes
+        if self._pending_setpoint is None:
+            self._target_temperature = data.get("getRoomTemperatureSetpoint")
+
+        mode = data.get("getOperationMode")
+        # Update the generic device attributes, only when they changed
+        if (program, mode) != (self._current_program, self._current_mode):
+            logger.debug("%s current mode : %s", self._name, mode)
+            self._current_program = program
+            self._current_mode = mode
             self._attributes = {}
 #            self._attributes["room_temperature"] = _room_temperature
             self._attributes["active_mycomfort_program"] = self._current_program
@@ -152,13 +341,14 @@ class myComfortClimate(ClimateEntity):
 #            self._attributes["error_history"] = self._api.getErrorHistory()
 #            self._attributes["active_error"] = self._api.getActiveError()
 
-            # Update the specific device attributes
-            self._current_action = self._api.getBurnerActive()
+        # Update the specific device attributes
+        self._current_action = data.get("getBurnerActive")
+        self._restored = False
 
-        except requests.exceptions.ConnectionError:
-            logger.error("Unable to retrieve data from myComfort server")
-        except ValueError:
-            logger.error("Unable to decode data from myComfort server")
+    @property
+    def available(self):
+        """Return True unless the gateway or the module failed too many times."""
+        return self.coordinator.available(self._api)
 
     @property
     def supported_features(self):
@@ -190,7 +380,7 @@ class myComfortClimate(ClimateEntity):
         """Return current hvac mode."""
         return MYCOMFORT_TO_HA_HVAC_HEATING.get(self._current_mode)
 
-    def set_hvac_mode(self, hvac_mode):
+    async def async_set_hvac_mode(self, hvac_mode):
         """Set a new hvac mode on the ViCare API."""
         mycomfort_mode = HA_TO_MYCOMFORT_HVAC_HEATING.get(hvac_mode)
         if mycomfort_mode is None:
@@ -200,7 +390,11 @@ class myComfortClimate(ClimateEntity):
             return
 
         logger.debug("Setting hvac mode to %s / %s", hvac_mode, mycomfort_mode)
-        self._api.setMode(mycomfort_mode)
+        await self._api.setMode(mycomfort_mode)
+        self._current_mode = mycomfort_mode
+        self._attributes = {**self._attributes, "active_mycomfort_mode": mycomfort_mode}
+        self.async_write_ha_state()
+        await self.coordinator.async_request_refresh()
 
     @property
     def hvac_modes(self):
@@ -229,14 +423,50 @@ class myComfortClimate(ClimateEntity):
         """Return the precision of the system."""
         return PRECISION_TENTHS
 
-    def set_temperature(self, **kwargs):
-        """Set new target temperatures."""
+    async def async_set_temperature(self, **kwargs):
+        """Set new target temperatures.
+
+        The new target is shown right away, while bursts of changes (e.g. from
+        dragging a slider) are debounced so only the last one of every
+        MYCOMFORT_SETPOINT_DEBOUNCE seconds is written.
+        """
         temp = kwargs.get(ATTR_TEMPERATURE)
         if temp is not None:
-            self._api.setRoomTemperatureSetpoint(temp)
-            self._api.setDuration(60)
-#            self._api.setProgramTemperature(self._current_program, temp)
+            self._pending_setpoint = temp
             self._target_temperature = temp
+            self.async_write_ha_state()
+            await self._setpoint_debouncer.async_call()
+
+    async def _async_write_setpoint(self):
+        """Write the last requested setpoint and its duration in one go.
+
+        The debouncer drops the setpoints requested while a write is in
+        flight, so they are written here right after it.
+        """
+        while self._pending_setpoint is not None:
+            temp = self._pending_setpoint
+            try:
+                await self._api.setRoomTemperatureSetpoint(
+                    temp, MYCOMFORT_SETPOINT_DURATION
+                )
+#                await self._api.setProgramTemperature(self._current_program, temp)
+            except myComfortGatewayError as err:
+                logger.error(
+                    "Unable to set the setpoint of %s to %s: %s", self._name, temp, err
+                )
+                if self._pending_setpoint != temp:
+                    continue
+                # Show the setpoint of the gateway again instead of the unwritten one
+                self._pending_setpoint = None
+                self._snapshot = None
+                self._update_from_snapshot()
+                self._published = self._published_state()
+                self.async_write_ha_state()
+                return
+            if self._pending_setpoint == temp:
+                self._pending_setpoint = None
+        # Poll fast again while the circuit reacts to the new setpoint
+        await self.coordinator.async_request_refresh()
 
     @property
     def preset_mode(self):
@@ -246,13 +476,13 @@ class myComfortClimate(ClimateEntity):
     @property
     def preset_modes(self):
         """Return the available preset mode."""
-        return list(MYCOMFORT_TO_HA_PRESET_HEATING)
+        return list(HA_TO_MYCOMFORT_PRESET_HEATING)
 
     def set_preset_mode(self, preset_mode):
         """Set new preset mode and deactivate any existing programs."""
         mycomfort_program = HA_TO_MYCOMFORT_PRESET_HEATING.get(preset_mode)
         if mycomfort_program is None:
-            loger.error(
+            logger.error(
                 "Cannot set invalid mycomfort program: %s / %s",
                 preset_mode,
                 mycomfort_program,
@@ -266,4 +496,32 @@ class myComfortClimate(ClimateEntity):
     @property
     def extra_state_attributes(self):
         """Show Device Attributes."""
-        return self._attributes
+        attributes = self._attributes
+        program = MYCOMFORT_MODE_PROGRAMS.get(self._current_mode)
+        schedule = self._api.cached_schedule(program) if program else None
+        if schedule is not None:
+            attributes = {**attributes, ATTR_SCHEDULE: schedule}
+        if self._restored:
+            return {**attributes, ATTR_RESTORED: True}
+        return attributes
+
+    async def async_read_schedule(self, program, refresh=False):
+        """Fire a weekly program as an event, reading it only if not cached."""
+        schedule = await self._api.schedule(program, refresh)
+        self.hass.bus.async_fire(
+            EVENT_SCHEDULE,
+            {
+                ATTR_ENTITY_ID: self.entity_id,
+                ATTR_PROGRAM: program,
+                ATTR_SCHEDULE: schedule,
+            },
+        )
+        self.async_write_ha_state()
+
+    async def async_write_schedule(self, program, schedule):
+        """Write the periods of a weekly program that changed."""
+        written = await self._api.set_schedule(program, schedule)
+        logger.debug(
+            "%s: %s values of heating program %s written", self._name, written, program
+        )
+        self.async_write_ha_state()
@@ -0,0 +1,584 @@
+"""Windhager myComfort update coordinator."""
+import asyncio
+from collections import Counter, defaultdict
+from datetime import timedelta
+import logging
+import math
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .alarms import EVENT_ALARM, myComfortAlarmFeed
+from .derived import myComfortCounterWindow
+from .gateway import (
+    BURNER_EFFECTS_BOILER,
+    BURNER_EFFECTS_MODULE,
+    DATAPOINT_EFFECTS,
+    OPERATION_MODES,
+    myComfortGatewayError,
+)
+from .snapshot import EMPTY_SNAPSHOT, myComfortSnapshot
+
+logger = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_NORMAL = "normal"
+TIER_HOURLY = "hourly"
+TIER_DAILY = "daily"
+
+TIERS = [TIER_FAST, TIER_NORMAL, TIER_HOURLY, TIER_DAILY]
+
+# Default refresh period of each tier in seconds, TIER_NORMAL follows scan_interval
+DEFAULT_TIER_PERIODS = {
+    TIER_FAST: 30,
+    TIER_HOURLY: 3600,
+    TIER_DAILY: 86400,
+}
+
+ACTIVITY_ACTIVE = "active"
+ACTIVITY_IDLE = "idle"
+ACTIVITY_STANDBY = "standby"
+
+# Datapoints of every module fetched to follow the activity
+ACTIVITY_DATAPOINTS = ["getBurnerActive", "getOperationMode"]
+# Datapoints of every boiler fetched to follow its error history
+ALARM_DATAPOINTS = ["getErrorCount"]
+
+# Seconds a write keeps the system active after the last one
+ACTIVE_HOLD = 600
+# Minimum period in seconds of the fast and normal tiers while in stand-by
+STANDBY_PERIOD = 600
+
+# Shortest interval in seconds between cycles when spreading the devices
+PHASE_MIN_INTERVAL = 5
+
+# Seconds an on-demand refresh waits to gather more requests
+REQUEST_REFRESH_COOLDOWN = 1
+
+# Consecutive failed cycles after which the circuit breaker trips
+BREAKER_THRESHOLD = 3
+# Bounds in seconds of the backoff between health probes of a tripped breaker
+BREAKER_MIN_BACKOFF = 30
+BREAKER_MAX_BACKOFF = 600
+
+
+class myComfortCoordinator(DataUpdateCoordinator):
+    """Fetch every boiler and module into a shared snapshot.
+
+    Each datapoint belongs to a refresh tier. Every device has a phase that
+    spreads the devices evenly over the period of each tier: a tier of a
+    device is due once per period, when its slot starts. Cycles run often
+    enough to fetch every device in its own slot, so the gateway sees a
+    steady trickle of requests rather than a burst each period.
+
+    A device that fails keeps its last snapshot, and its entities only turn
+    unavailable after BREAKER_THRESHOLD failures in a row. A cycle in which
+    every device failed keeps the last data too, until BREAKER_THRESHOLD such
+    cycles trip the circuit breaker: all entities turn unavailable at once
+    and, instead of full cycles, a single health request probes the gateway
+    with exponential backoff. Once it answers, one full refresh brings every
+    datapoint up to date.
+
+    Polling also follows the activity of the system. The fast tier only runs
+    at its own period while a burner is active or shortly after a write; when
+    idle it falls back to the normal period, and when every circuit is in
+    stand-by the fast and normal tiers stretch to STANDBY_PERIOD.
+
+    Only the datapoints wanted by an entity in use, and reported by the
+    device, are fetched.
+
+    Writes and burners switching on or off are followed right away: the
+    written datapoints and the ones they affect, or the ones the burner
+    affects, are read on the next cycle whatever their tier.
+
+    The error counter of every boiler is followed by an alarm feed: when it
+    grows, only the new error history entries are read, an EVENT_ALARM is
+    fired for each of them and the alarm text is read again.
+    """
+
+    def __init__(self, hass, name, api, scan_interval, tier_periods=None):
+        """Initialize the coordinator."""
+        self._tier_periods = {**DEFAULT_TIER_PERIODS, TIER_NORMAL: scan_interval}
+        self._tier_periods.update(tier_periods or {})
+        self._tiers = {}
+        self._fetched = {}
+        self._failures = 0
+        self._device_failures = Counter()
+        self._backoff = None
+        self._written = None
+        self._windows = defaultdict(myComfortCounterWindow)
+        self._alarms = defaultdict(myComfortAlarmFeed)
+        self._wanted = defaultdict(Counter)
+        self._interactive = defaultdict(Counter)
+        self._unfetched = set()
+        self._seen = set()
+        self._phases = {}
+        self._indexes = {}
+        self.activity = ACTIVITY_ACTIVE
+        super().__init__(
+            hass,
+            logger,
+            name=name,
+            update_interval=self._cycle_interval(),
+            request_refresh_debouncer=Debouncer(
+                hass, logger, cooldown=REQUEST_REFRESH_COOLDOWN, immediate=False
+            ),
+        )
+        self.api = api
+        self.boilers = []
+        self.modules = []
+
+    def set_tier(self, datapoint, tier):
+        """Assign a datapoint to a refresh tier."""
+        self._tiers[datapoint] = tier
+        if self._backoff is None:
+            self.update_interval = self._cycle_interval()
+
+    def tier(self, datapoint):
+        """Return the refresh tier of a datapoint."""
+        return self._tiers.get(datapoint, TIER_NORMAL)
+
+    def _period(self, tier):
+        """Return the current period of a tier, following the activity."""
+        period = self._tier_periods[tier]
+        if self.activity == ACTIVITY_ACTIVE or tier not in (TIER_FAST, TIER_NORMAL):
+            return period
+        if tier == TIER_FAST:
+            period = max(period, self._tier_periods[TIER_NORMAL])
+        if self.activity == ACTIVITY_STANDBY:
+            period = max(period, STANDBY_PERIOD)
+        return period
+
+    def _base_period(self):
+        """Return the period of the fastest tier in use."""
+        tiers = set(self._tiers.values()) | {TIER_NORMAL}
+        return min(self._period(tier) for tier in tiers)
+
+    def _cycle_interval(self):
+        """Return the period of the fastest tier in use, split between the devices."""
+        period = self._base_period()
+        return timedelta(
+            seconds=max(
+                period / max(len(self._phases), 1), min(period, PHASE_MIN_INTERVAL)
+            )
+        )
+
+    def _rephase(self):
+        """Spread the slots of the known devices evenly, in serial number order."""
+        serial_nos = sorted(
+            device.serial_no for device in self.boilers + self.modules
+        )
+        self._phases = {
+            serial_no: index / len(serial_nos)
+            for index, serial_no in enumerate(serial_nos)
+        }
+        if self._backoff is None:
+            self.update_interval = self._cycle_interval()
+
+    def _slot(self, device, tier, now):
+        """Return the start of the current slot of a tier of a device.
+
+        The offset follows the fastest period, so the slots of slower tiers
+        coincide with slots of faster ones and share their subtree lookups.
+        """
+        period = self._period(tier)
+        offset = self._phases.get(device.serial_no, 0) * self._base_period()
+        # Half a cycle of slack so a slot is not missed because of timer jitter
+        now += self._cycle_interval().total_seconds() / 2
+        return math.floor((now - offset) / period) * period + offset
+
+    def _activity(self, data, now):
+        """Return whether the system is active, idle or in stand-by."""
+        if self._written is not None and now - self._written < ACTIVE_HOLD:
+            return ACTIVITY_ACTIVE
+        snapshots = [data.get(module.serial_no, {}) for module in self.modules]
+        if any(snapshot.get("getBurnerActive") for snapshot in snapshots):
+            return ACTIVITY_ACTIVE
+        if snapshots and all(
+            snapshot.get("getOperationMode") == OPERATION_MODES[0]
+            for snapshot in snapshots
+        ):
+            return ACTIVITY_STANDBY
+        return ACTIVITY_IDLE
+
+    def _due(self, device, datapoints, now):
+        """Return the datapoints of a device whose tier is due for a refresh."""
+        return [
+            datapoint
+            for datapoint in datapoints
+            if datapoint in device.stale
+            or (device.serial_no, datapoint) in self._unfetched
+            or self._fetched.get((device.serial_no, self.tier(datapoint)), -math.inf)
+            < self._slot(device, self.tier(datapoint), now)
+        ]
+
+    async def async_discover(self):
+        """Discover the boilers and modules, returning the ones not known yet."""
+        boilers, modules = await self.api.discover()
+        self.boilers, new_boilers = self._reconcile(self.boilers, boilers)
+        self.modules, new_modules = self._reconcile(self.modules, modules)
+        self._rephase()
+        for device in self.boilers + self.modules:
+            if device.datapoints is None:
+                await device.probe()
+                self._check_datapoints(device, device.datapoints)
+        return new_boilers, new_modules
+
+    async def async_reprobe(self, devices):
+        """Probe known devices again, returning the ones reporting new datapoints.
+
+        Only the datapoints of the catalog a device did not report are read,
+        and the ones found earlier are kept, so a gap in the answers of the
+        gateway does not remove entities.
+        """
+        gained = []
+        for device in devices:
+            reported = set(device.datapoints or ())
+            missing = [
+                datapoint for datapoint in device.catalog if datapoint not in reported
+            ]
+            if not missing:
+                continue
+            await device.probe(missing)
+            found = [datapoint for datapoint in missing if datapoint in device.datapoints]
+            self._check_datapoints(device, found)
+            if found:
+                logger.info("myComfort %s now reports %s", device.name, ", ".join(found))
+                gained.append(device)
+            device.datapoints = [
+                datapoint
+                for datapoint in device.catalog
+                if datapoint in reported or datapoint in found
+            ]
+        return gained
+
+    def _check_datapoints(self, device, datapoints):
+        """Warn about probed values that do not decode as their datapoint expects.
+
+        The datapoint table is not read from the gateway, so a wrong address or
+        label would otherwise show a wrong value without a word.
+        """
+        for datapoint, problem in device.implausible(datapoints).items():
+            logger.warning(
+                "myComfort %s answered %s at %s: %s, its address or labels may "
+                "be wrong",
+                device.name,
+                datapoint,
+                device.oid(datapoint),
+                problem,
+            )
+
+    def topology(self):
+        """Return the known boilers and modules in a storable form."""
+        return {
+            "boilers": [device.as_dict() for device in self.boilers],
+            "modules": [device.as_dict() for device in self.modules],
+        }
+
+    def load_topology(self, topology):
+        """Use boilers and modules saved by an earlier discovery."""
+        self.boilers, self.modules = self.api.devices(topology)
+        self._rephase()
+
+    def _reconcile(self, known, discovered):
+        """Merge a discovery into the known devices, keeping their instances."""
+        known = {device.serial_no: device for device in known}
+        devices = []
+        new = []
+        for device in discovered:
+            if device.serial_no in known:
+                devices.append(known.pop(device.serial_no))
+            else:
+                devices.append(device)
+                new.append(device)
+        for device in known.values():
+            logger.warning("myComfort device %s is no longer reported", device.name)
+        return devices, new
+
+    @callback
+    def async_want(self, device, datapoints, restored=False, interactive=False):
+        """Fetch datapoints of a device until the returned callback is called.
+
+        Datapoints new to the fetch plan are fetched on the next cycle whatever
+        their tier, unless the entity restored its state: then their first
+        fetch waits for the next slot of the device. Datapoints of
+        interactive entities are read before the background ones.
+        """
+        wanted = self._wanted[device.serial_no]
+        new = [datapoint for datapoint in datapoints if wanted[datapoint] <= 0]
+        wanted.update(datapoints)
+        if interactive:
+            self._interactive[device.serial_no].update(datapoints)
+        if new and restored:
+            self._stagger(device, new)
+        elif new:
+            self._unfetched.update((device.serial_no, datapoint) for datapoint in new)
+            self.hass.async_create_task(self.async_request_refresh())
+
+        @callback
+        def async_unwant():
+            wanted.subtract(datapoints)
+            if interactive:
+                self._interactive[device.serial_no].subtract(datapoints)
+
+        return async_unwant
+
+    def _stagger(self, device, datapoints):
+        """Make the tiers of datapoints first due at the next slot of the device."""
+        now = time.monotonic()
+        for datapoint in datapoints:
+            tier = self.tier(datapoint)
+            self._fetched.setdefault(
+                (device.serial_no, tier), self._slot(device, tier, now)
+            )
+
+    def datapoints(self, device):
+        """Return the fetch plan of a boiler or module."""
+        wanted = [
+            datapoint
+            for datapoint, count in self._wanted[device.serial_no].items()
+            if count > 0
+        ]
+        if device in self.modules:
+            wanted += [
+                datapoint
+                for datapoint in ACTIVITY_DATAPOINTS
+                if datapoint not in wanted
+            ]
+        if device in self.boilers:
+            wanted += [
+                datapoint for datapoint in ALARM_DATAPOINTS if datapoint not in wanted
+            ]
+        return [datapoint for datapoint in wanted if device.has(datapoint)]
+
+    def available(self, device):
+        """Return True unless the gateway or a device failed too many times."""
+        return (
+            self.last_update_success
+            and self._device_failures[device.serial_no] < BREAKER_THRESHOLD
+        )
+
+    def fetched(self, device, datapoints):
+        """Return True once datapoints of a device were fetched since the start.
+
+        A fetched datapoint may still be None, e.g. for a failed sensor.
+        Datapoints the device does not report are not waited for.
+        """
+        return all(
+            (device.serial_no, datapoint) in self._seen
+            for datapoint in datapoints
+            if device.has(datapoint)
+        )
+
+    def snapshot(self, device):
+        """Return the last fetched values of a boiler or module."""
+        return (self.data or {}).get(device.serial_no, EMPTY_SNAPSHOT)
+
+    def _index(self, device, datapoints):
+        """Return the datapoint index shared by the snapshots of a fetch plan."""
+        plan, index = self._indexes.get(device.serial_no, (None, None))
+        if plan != datapoints:
+            index = {datapoint: position for position, datapoint in enumerate(datapoints)}
+            self._indexes[device.serial_no] = (datapoints, index)
+        return index
+
+    def derived(self, device):
+        """Return the rolling counter window of a boiler."""
+        return self._windows[device.serial_no]
+
+    def alarms(self, device):
+        """Return the alarm feed of a boiler."""
+        return self._alarms[device.serial_no]
+
+    async def _async_update_data(self):
+        """Fetch the due datapoints, or probe the gateway if the breaker tripped."""
+        if self._backoff is not None:
+            await self._async_probe()
+
+        try:
+            data = await self._async_fetch()
+        except myComfortGatewayError as err:
+            self._failures += 1
+            if self._failures < BREAKER_THRESHOLD and self.data is not None:
+                logger.debug("Keeping the last myComfort data after: %s", err)
+                return self.data
+            if self._failures >= BREAKER_THRESHOLD:
+                logger.warning(
+                    "myComfort gateway failed %s times in a row, probing it every %s s",
+                    self._failures,
+                    BREAKER_MIN_BACKOFF,
+                )
+                self._backoff = BREAKER_MIN_BACKOFF
+                self.update_interval = timedelta(seconds=self._backoff)
+            raise UpdateFailed(err) from err
+        self._failures = 0
+
+        activity = self._activity(data, time.monotonic())
+        if activity != self.activity:
+            logger.debug("myComfort %s is now %s", self.name, activity)
+            self.activity = activity
+            self.update_interval = self._cycle_interval()
+        return data
+
+    async def _async_probe(self):
+        """Send one health request, closing the breaker if it succeeds."""
+        try:
+            await self.api.ping()
+        except myComfortGatewayError as err:
+            self._backoff = min(self._backoff * 2, BREAKER_MAX_BACKOFF)
+            self.update_interval = timedelta(seconds=self._backoff)
+            raise UpdateFailed(
+                f"myComfort gateway still unreachable, next probe in {self._backoff} s"
+            ) from err
+        logger.info("myComfort gateway is reachable again")
+        self._backoff = None
+        self._failures = 0
+        self._fetched.clear()
+        self.update_interval = self._cycle_interval()
+
+    async def _async_fetch(self):
+        """Fetch the due datapoints of all boilers and modules in parallel.
+
+        Every device reads its subtrees in order, the gateway scheduler bounds
+        the requests in flight and starts the interactive ones first. A device
+        that fails keeps its last snapshot; the error is only raised when
+        every device failed.
+        """
+        now = time.monotonic()
+        devices = self.boilers + self.modules
+        results = await asyncio.gather(
+            *(self._async_fetch_device(device, now) for device in devices),
+            return_exceptions=True,
+        )
+        data = {}
+        errors = []
+        for device, result in zip(devices, results):
+            if not isinstance(result, Exception):
+                self._device_failures.pop(device.serial_no, None)
+                data[device.serial_no] = result
+                continue
+            if not isinstance(result, myComfortGatewayError):
+                raise result
+            errors.append(result)
+            self._device_failures[device.serial_no] += 1
+            if self._device_failures[device.serial_no] == BREAKER_THRESHOLD:
+                logger.warning(
+                    "myComfort %s failed %s times in a row: %s",
+                    device.name,
+                    BREAKER_THRESHOLD,
+                    result,
+                )
+            data[device.serial_no] = self.snapshot(device)
+        if errors and len(errors) == len(devices):
+            raise errors[0]
+        self._follow_burners(data)
+        return data
+
+    def _follow_burners(self, data):
+        """Read what a burner switching on or off changed on the next cycle."""
+        flipped = []
+        for module in self.modules:
+            previous = self.snapshot(module)
+            snapshot = data[module.serial_no]
+            if snapshot is previous or previous.get("getBurnerActive") is None:
+                continue
+            if snapshot.get("getBurnerActive") != previous.get("getBurnerActive"):
+                flipped.append(module)
+        if not flipped:
+            return
+        for module in flipped:
+            self._invalidate(module, BURNER_EFFECTS_MODULE)
+        for boiler in self.boilers:
+            self._invalidate(boiler, BURNER_EFFECTS_BOILER)
+        self.hass.async_create_task(self.async_request_refresh())
+
+    def _invalidate(self, device, datapoints):
+        """Fetch the datapoints of a device in its plan on the next cycle."""
+        plan = self.datapoints(device)
+        self._unfetched.update(
+            (device.serial_no, datapoint) for datapoint in datapoints if datapoint in plan
+        )
+
+    async def _async_fetch_device(self, device, now):
+        """Fetch the due datapoints of one device and return its snapshot.
+
+        The previous snapshot is returned when no value changed, and without
+        decoding anything when nothing was due.
+        """
+        datapoints = self.datapoints(device)
+        if device.stale:
+            self._written = now
+            # Written datapoints are read back along with the ones they affect,
+            # except those no entity shows
+            for datapoint in list(device.stale):
+                device.stale.update(DATAPOINT_EFFECTS.get(datapoint, ()))
+            device.stale.intersection_update(datapoints)
+        due = self._due(device, datapoints, now)
+        for datapoint in datapoints:
+            self.api.stats.record_cache(datapoint, datapoint not in due)
+        if due:
+            interactive = self._interactive[device.serial_no]
+            await device.refresh(
+                due, [datapoint for datapoint in due if interactive[datapoint] > 0]
+            )
+            if "getErrorCount" in due and await self._async_update_alarms(device):
+                # The alarm text is only read on its own tier otherwise, and was
+                # just read by the feed of a boiler without an error history
+                if (
+                    "getAlarmText" in datapoints
+                    and "getAlarmText" not in due
+                    and self._alarms[device.serial_no].history
+                ):
+                    await device.refresh(["getAlarmText"])
+            for datapoint in due:
+                tier = self.tier(datapoint)
+                self._fetched[(device.serial_no, tier)] = self._slot(device, tier, now)
+                self._unfetched.discard((device.serial_no, datapoint))
+                self._seen.add((device.serial_no, datapoint))
+        index = self._index(device, datapoints)
+        snapshot = self.snapshot(device)
+        if not due and snapshot.indexed(index):
+            return snapshot
+        values = []
+        for datapoint in datapoints:
+            try:
+                values.append(device.get(datapoint))
+            except ValueError:
+                # Restored datapoints may simply not have been fetched yet
+                if datapoint in due:
+                    logger.error(
+                        "Unable to decode %s of %s from myComfort gateway",
+                        datapoint,
+                        device.name,
+                    )
+                values.append(None)
+        values = tuple(values)
+        if not snapshot.same(index, values):
+            snapshot = myComfortSnapshot(index, values)
+        if device in self.boilers and due:
+            self._windows[device.serial_no].add(now, snapshot)
+        return snapshot
+
+    async def _async_update_alarms(self, boiler):
+        """Fetch the new error history entries of a boiler and fire their events."""
+        try:
+            count = int(boiler.get("getErrorCount"))
+            alarms = await self._alarms[boiler.serial_no].async_update(boiler, count)
+        except (myComfortGatewayError, TypeError, ValueError) as err:
+            # The cursor did not move, the entries are fetched on the next cycle
+            logger.warning("Unable to read the error history of %s: %s", boiler.name, err)
+            return []
+        for alarm in alarms:
+            logger.info("myComfort alarm on %s: %s", boiler.name, alarm["alarm"])
+            self.hass.bus.async_fire(
+                EVENT_ALARM,
+                {
+                    "gateway": self.name,
+                    "device": boiler.name,
+                    "serial_no": boiler.serial_no,
+                    **alarm,
+                },
+            )
+        return alarms
@@ -0,0 +1,97 @@
+"""Metrics derived from the counters of a Windhager myComfort boiler."""
+from collections import deque
+
+# Span in seconds of the rolling window of counter samples
+DERIVED_WINDOW = 86400
+# Minimum span in seconds before the derived metrics are reported
+DERIVED_MIN_SPAN = 3600
+# Most samples kept per boiler, two per hour for hourly counters
+DERIVED_SAMPLES = 96
+
+# Counters sampled into the window, in the order of a sample's values
+DERIVED_COUNTERS = [
+    "getBoilerConsumptionTotal",
+    "getBurnerStarts",
+    "getBurnerHours",
+]
+
+
+class myComfortCounterWindow:
+    """Rolling window of the consumption, start and hour counters of a boiler.
+
+    Samples are only appended when a counter changed, a run of unchanged
+    samples collapses into its first and last one. Every metric is the
+    difference between the oldest and newest sample, so nothing is replayed
+    from the history.
+    """
+
+    __slots__ = ("samples", "maintenance")
+
+    def __init__(self):
+        """Initialize an empty window."""
+        self.samples = deque(maxlen=DERIVED_SAMPLES)
+        self.maintenance = None
+
+    def add(self, now, snapshot):
+        """Add the counters of a snapshot taken at a monotonic time."""
+        self.maintenance = snapshot.get("getOperatingTimeMaintenance")
+        counters = tuple(snapshot.get(datapoint) for datapoint in DERIVED_COUNTERS)
+        if None in counters:
+            return
+
+        if self.samples and any(
+            new < old for new, old in zip(counters, self.samples[-1][1])
+        ):
+            # A counter was reset, the older samples are meaningless
+            self.samples.clear()
+        if len(self.samples) >= 2 and self.samples[-2][1] == self.samples[-1][1] == counters:
+            self.samples[-1] = (now, counters)
+        else:
+            self.samples.append((now, counters))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= DERIVED_WINDOW:
+            self.samples.popleft()
+
+    def _deltas(self):
+        """Return the window span in hours and the increase of every counter."""
+        if len(self.samples) < 2:
+            return None
+        (start, first), (end, last) = self.samples[0], self.samples[-1]
+        if end - start < DERIVED_MIN_SPAN:
+            return None
+        return ((end - start) / 3600, *(new - old for new, old in zip(last, first)))
+
+    @property
+    def consumption_rate(self):
+        """Return the pellet consumption in kg/h."""
+        deltas = self._deltas()
+        if deltas is None:
+            return None
+        hours, consumption, _, _ = deltas
+        # The consumption counter is in tonnes
+        return round(consumption * 1000 / hours, 2)
+
+    @property
+    def duty_cycle(self):
+        """Return the share of time the burner ran, in %."""
+        deltas = self._deltas()
+        if deltas is None:
+            return None
+        hours, _, _, burner_hours = deltas
+        return round(min(burner_hours / hours, 1) * 100, 1)
+
+    @property
+    def run_length(self):
+        """Return the average burner run per start, in minutes."""
+        deltas = self._deltas()
+        if deltas is None or not deltas[2]:
+            return None
+        _, _, starts, burner_hours = deltas
+        return round(burner_hours * 60 / starts, 1)
+
+    @property
+    def hours_until_maintenance(self):
+        """Return the hours until maintenance at the current duty cycle."""
+        duty_cycle = self.duty_cycle
+        if not duty_cycle or self.maintenance is None:
+            return None
+        return round(self.maintenance / (duty_cycle / 100))
@@ -0,0 +1,825 @@
+"""Asynchronous client for the Windhager myComfort gateway."""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+
+import aiohttp
+
+from .scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_WRITE,
+    myComfortScheduler,
+)
+from .stats import myComfortStats
+
+logger = logging.getLogger(__name__)
+
+API_LOOKUP = "/api/1.0/lookup"
+API_DATAPOINT = "/api/1.0/datapoint"
+API_DATAPOINTS = "/api/1.0/datapoints"
+
+MYCOMFORT_SUBNET = 1
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECTIONS = 2
+# Requests per second sent to a gateway at most
+DEFAULT_REQUEST_RATE = 10
+
+FCT_TYPE_BOILER = 9
+FCT_TYPE_HEATING_CIRCUIT = 14
+FCT_TYPE_DHW_CIRCUIT = 15
+
+OPERATION_MODES = [
+    "Stand-by",
+    "Heating program 1",
+    "Heating program 2",
+    "Heating program 3",
+    "Heating mode",
+    "Setback mode",
+    "DHW operation",
+]
+
+ACTIVE_PROGRAMS = [
+    "Stand-by",
+    "Heating mode",
+    "Setback mode",
+    "DHW load",
+    "ECO / Party",
+    "Holiday program",
+    "Screed",
+    "Frost protection",
+    "Stand-by heating limit",
+    "Manual mode",
+    "Test",
+    "Chimney sweep mode",
+    "Burner OFF",
+    "Burner ON",
+    "Automatic boiler",
+    "Solid fuel boiler",
+    "Buffer",
+]
+
+# Datapoint addresses relative to their function, as level/object/instance.
+# The names are those of the getters of the mycomfortclient Gateway this
+# client replaces, which is not part of this repository. The addresses, the
+# labels of OPERATION_MODES and ACTIVE_PROGRAMS and the shape of the lookup
+# answers were written by hand and the simulator is built from them: check any
+# change against traffic recorded from a real gateway with bench/parity.py.
+# Probed values that do not decode as expected are logged as warnings.
+DATAPOINTS = {
+    # boiler
+    "getBoilerTemperature": "0/7/0",
+    "getBoilerSetpointTemperature": "0/8/0",
+    "getBurnerModulation": "0/9/0",
+    "getExhaustTemperature": "0/11/0",
+    "getBufferTemperature": "0/14/0",
+    "getAlarmText": "0/20/0",
+    "getBurnerStarts": "2/1/0",
+    "getBurnerHours": "2/2/0",
+    "getBoilerConsumptionBulkfill": "2/5/0",
+    "getBoilerConsumptionTotal": "2/6/0",
+    "getOperatingTimeCleaning": "2/10/0",
+    "getOperatingTimeMainCleaning": "2/11/0",
+    "getOperatingTimeMaintenance": "2/12/0",
+    "getErrorCount": "3/0/0",
+    # heating module
+    "getOutsideTemperature": "0/0/0",
+    "getFlowTemperature": "0/1/0",
+    "getFlowSetpointTemperature": "0/2/0",
+    "getRoomTemperatureSetpoint": "0/3/0",
+    "getBurnerActive": "0/5/0",
+    "getOperationMode": "1/0/0",
+    "getActiveProgram": "1/1/0",
+    "getDuration": "1/2/0",
+    # DHW circuit
+    "getDHWTemperature": "0/6/0",
+    "getDHWSetpointTemperature": "0/7/0",
+}
+
+# Datapoints returned as an index into a list of labels
+DATAPOINTS_ENUM = {
+    "getOperationMode": OPERATION_MODES,
+    "getActiveProgram": ACTIVE_PROGRAMS,
+}
+
+# Datapoints returned as 0/1 flags
+DATAPOINTS_FLAG = ["getBurnerActive"]
+
+# Datapoints returned as text, every other one is a number
+DATAPOINTS_TEXT = ["getAlarmText"]
+
+# Datapoints of a module changed by a write of another one
+DATAPOINT_EFFECTS = {
+    "getOperationMode": [
+        "getActiveProgram",
+        "getRoomTemperatureSetpoint",
+        "getFlowSetpointTemperature",
+        "getBurnerActive",
+    ],
+    "getRoomTemperatureSetpoint": [
+        "getActiveProgram",
+        "getFlowSetpointTemperature",
+        "getBurnerActive",
+    ],
+    "getDuration": ["getActiveProgram"],
+}
+
+# Datapoints changed when the burner of a module switches on or off, on the
+# module and on the boilers
+BURNER_EFFECTS_MODULE = ["getFlowSetpointTemperature"]
+BURNER_EFFECTS_BOILER = ["getBurnerModulation", "getBoilerSetpointTemperature"]
+
+# Error history entries of a boiler, a ring of ERROR_HISTORY_SIZE instances
+# holding the entries logged since the error counter was last reset
+ERROR_HISTORY = "3/1"
+ERROR_HISTORY_SIZE = 10
+
+# Levels of the weekly heating programs 1 to 3 of a module. Each has one
+# object per weekday, holding the start and end minute of TIME_PROGRAM_PERIODS
+# periods as consecutive instances; a period ending at its start is unused.
+TIME_PROGRAMS = ["14", "15", "16"]
+TIME_PROGRAM_PERIODS = 3
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+# Datapoints a boiler may report
+DATAPOINTS_BOILER = [
+    "getBoilerTemperature",
+    "getBoilerSetpointTemperature",
+    "getBurnerModulation",
+    "getBurnerStarts",
+    "getBurnerHours",
+    "getExhaustTemperature",
+    "getBufferTemperature",
+    "getBoilerConsumptionBulkfill",
+    "getBoilerConsumptionTotal",
+    "getOperatingTimeCleaning",
+    "getOperatingTimeMainCleaning",
+    "getOperatingTimeMaintenance",
+    "getAlarmText",
+    "getErrorCount",
+]
+
+# Datapoints a heating module may report
+DATAPOINTS_MODULE = [
+    "getOutsideTemperature",
+    "getFlowTemperature",
+    "getFlowSetpointTemperature",
+    "getActiveProgram",
+    "getRoomTemperatureSetpoint",
+    "getOperationMode",
+    "getBurnerActive",
+]
+
+# Additional datapoints of modules driving a DHW circuit
+DATAPOINTS_DHW = [
+    "getDHWTemperature",
+    "getDHWSetpointTemperature",
+]
+
+# Datapoints that may exist, by function type. Which of them a device really
+# reports is probed once when it is discovered.
+CATALOG = {
+    FCT_TYPE_BOILER: DATAPOINTS_BOILER,
+    FCT_TYPE_HEATING_CIRCUIT: DATAPOINTS_MODULE,
+    FCT_TYPE_DHW_CIRCUIT: DATAPOINTS_MODULE + DATAPOINTS_DHW,
+}
+
+
+class myComfortGatewayError(Exception):
+    """The myComfort gateway could not be reached or returned an error."""
+
+
+class myComfortAuthError(myComfortGatewayError):
+    """The myComfort gateway rejected the credentials."""
+
+
+class myComfortNotSupportedError(myComfortGatewayError):
+    """The myComfort gateway does not support the requested path."""
+
+
+class _DigestAuth:
+    """HTTP digest authentication as implemented by the myComfort gateway."""
+
+    def __init__(self, username, password):
+        """Initialize the authenticator."""
+        self._username = username
+        self._password = password
+        self._challenge = None
+        self._nonce_count = 0
+
+    @property
+    def ready(self):
+        """Return True once a challenge was received."""
+        return self._challenge is not None
+
+    def challenge(self, header):
+        """Store the parameters of a WWW-Authenticate digest challenge."""
+        self._challenge = dict(re.findall(r'(\w+)="?([^",]+)"?', header))
+        self._nonce_count = 0
+
+    def header(self, method, path):
+        """Return the Authorization header for a request."""
+        realm = self._challenge.get("realm", "")
+        nonce = self._challenge.get("nonce", "")
+        qop = self._challenge.get("qop")
+        opaque = self._challenge.get("opaque")
+
+        ha1 = _md5(f"{self._username}:{realm}:{self._password}")
+        ha2 = _md5(f"{method}:{path}")
+        self._nonce_count += 1
+        nc = f"{self._nonce_count:08x}"
+        cnonce = os.urandom(8).hex()
+        if qop:
+            qop = "auth"
+            response = _md5(f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}")
+        else:
+            response = _md5(f"{ha1}:{nonce}:{ha2}")
+
+        header = (
+            f'Digest username="{self._username}", realm="{realm}", '
+            f'nonce="{nonce}", uri="{path}", response="{response}"'
+        )
+        if qop:
+            header += f', qop={qop}, nc={nc}, cnonce="{cnonce}"'
+        if opaque:
+            header += f', opaque="{opaque}"'
+        return header
+
+
+def _md5(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+class myComfortGateway:
+    """Client for one myComfort gateway, sharing one pooled HTTP session."""
+
+    def __init__(
+        self,
+        session,
+        host,
+        port,
+        username,
+        password,
+        timeout=DEFAULT_TIMEOUT,
+        connections=DEFAULT_CONNECTIONS,
+        stats=None,
+        rate=DEFAULT_REQUEST_RATE,
+        transport=None,
+    ):
+        """Initialize the client.
+
+        A transport, a coroutine function of (method, path, payload), may
+        answer the requests instead of the gateway.
+        """
+        self._session = session
+        self._base_url = f"http://{host}:{port}"
+        self._auth = _DigestAuth(username, password)
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._bulk_write = True
+        self.connections = connections
+        self.stats = stats or myComfortStats()
+        self._scheduler = myComfortScheduler(connections, rate, self.stats)
+        self._transport = transport or self._send
+
+    def record(self, recorder):
+        """Record every exchange with the gateway."""
+        self._transport = recorder.wrap(self._transport)
+
+    async def _request(self, method, path, payload=None, priority=None):
+        """Queue one request, writes first unless a priority is given.
+
+        A read queued while the same read is still waiting shares its answer.
+        """
+        if priority is None:
+            priority = PRIORITY_BACKGROUND if method == "GET" else PRIORITY_WRITE
+        return await self._scheduler.run(
+            lambda: self._send_recorded(method, path, payload),
+            priority,
+            (method, path) if method == "GET" else None,
+        )
+
+    async def _send_recorded(self, method, path, payload=None):
+        """Send one request, recording its latency and outcome."""
+        started = time.monotonic()
+        try:
+            result = await self._transport(method, path, payload)
+        except myComfortNotSupportedError:
+            self.stats.record_request(time.monotonic() - started)
+            raise
+        except myComfortGatewayError:
+            self.stats.record_request(time.monotonic() - started, error=True)
+            raise
+        self.stats.record_request(time.monotonic() - started)
+        return result
+
+    async def _send(self, method, path, payload=None):
+        """Send one request, answering a digest challenge only when needed.
+
+        Once challenged, requests carry the Authorization header right away,
+        reusing the nonce with an increasing nonce count. A rejection, e.g. of
+        an expired nonce, brings a new challenge and a single retry.
+        """
+        try:
+            for attempt in range(2):
+                headers = None
+                if self._auth.ready:
+                    headers = {"Authorization": self._auth.header(method, path)}
+                async with self._session.request(
+                    method,
+                    self._base_url + path,
+                    json=payload,
+                    timeout=self._timeout,
+                    headers=headers,
+                ) as response:
+                    if response.status != 401:
+                        return await self._decode(response)
+                    if attempt:
+                        break
+                    self._auth.challenge(
+                        response.headers.get("WWW-Authenticate", "")
+                    )
+                    self.stats.challenges += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise myComfortGatewayError(
+                f"Error communicating with myComfort gateway: {err}"
+            ) from err
+        except ValueError as err:
+            # e.g. an HTML error page instead of JSON
+            raise myComfortGatewayError(
+                f"Invalid answer from myComfort gateway: {err}"
+            ) from err
+        raise myComfortAuthError("Invalid myComfort credentials")
+
+    @staticmethod
+    async def _decode(response):
+        if response.status in (400, 404, 405, 501):
+            raise myComfortNotSupportedError(
+                f"myComfort gateway does not support {response.url.path}"
+            )
+        if response.status >= 400:
+            raise myComfortGatewayError(
+                f"myComfort gateway returned HTTP {response.status}"
+            )
+        if response.content_length == 0:
+            return None
+        return await response.json(content_type=None)
+
+    async def lookup(self, path="", priority=None):
+        """Return the lookup tree below a path."""
+        return await self._request("GET", f"{API_LOOKUP}{path}", priority=priority)
+
+    async def ping(self):
+        """Send a single cheap request to check the gateway answers."""
+        await self.lookup(f"/{MYCOMFORT_SUBNET}", PRIORITY_INTERACTIVE)
+
+    async def lookup_values(self, path, priority=None):
+        """Return the raw values of all datapoints below a path, by OID."""
+        values = {}
+        _collect_values(await self.lookup(path, priority), values)
+        return values
+
+    async def read(self, oid, priority=None):
+        """Return the raw value of one datapoint."""
+        result = await self._request(
+            "GET", f"{API_DATAPOINT}{oid}", priority=priority
+        )
+        if not isinstance(result, dict) or "value" not in result:
+            raise ValueError(f"Unexpected answer for datapoint {oid}")
+        return result["value"]
+
+    async def write(self, oid, value):
+        """Set the value of one datapoint."""
+        await self._request("PUT", API_DATAPOINT, {"OID": oid, "value": str(value)})
+
+    async def write_many(self, values):
+        """Set several datapoints, in one request when the gateway allows it."""
+        if len(values) > 1 and self._bulk_write:
+            try:
+                await self._request(
+                    "PUT",
+                    API_DATAPOINTS,
+                    [{"OID": oid, "value": str(value)} for oid, value in values.items()],
+                )
+                return
+            except myComfortNotSupportedError:
+                logger.debug("No bulk write support, writing datapoints one by one")
+                self._bulk_write = False
+        for oid, value in values.items():
+            await self.write(oid, value)
+
+    async def discover(self):
+        """Return the boilers and heating modules known to the gateway."""
+        boilers = []
+        modules = []
+        for node in await self.lookup(f"/{MYCOMFORT_SUBNET}"):
+            node_id = node["nodeId"]
+            serial = node.get("serialNo", node_id)
+            for function in await self.lookup(f"/{MYCOMFORT_SUBNET}/{node_id}"):
+                fct_type = function.get("fctType")
+                args = (
+                    self,
+                    node_id,
+                    function["fctId"],
+                    function.get("name", node.get("name", str(node_id))),
+                    f"{serial}-{function['fctId']}",
+                )
+                if fct_type == FCT_TYPE_BOILER:
+                    boilers.append(myComfortBoiler(*args))
+                elif fct_type in (FCT_TYPE_HEATING_CIRCUIT, FCT_TYPE_DHW_CIRCUIT):
+                    modules.append(
+                        myComfortModule(*args, dhw=fct_type == FCT_TYPE_DHW_CIRCUIT)
+                    )
+        return boilers, modules
+
+    def devices(self, topology):
+        """Return the boilers and heating modules of a saved topology."""
+        return (
+            [myComfortBoiler(self, **device) for device in topology["boilers"]],
+            [myComfortModule(self, **device) for device in topology["modules"]],
+        )
+
+
+class myComfortDevice:
+    """A boiler or heating module function behind the gateway.
+
+    Values are fetched one subtree (level) at a time into a table indexed by
+    OID, from which the getters are answered without further requests.
+    """
+
+    fct_type = None
+
+    def __init__(self, gateway, node_id, fct_id, name, serial_no, datapoints=None):
+        """Initialize the device."""
+        self._gateway = gateway
+        self._table = {}
+        self._no_lookup = set()
+        self.stale = set()
+        self.node_id = node_id
+        self.fct_id = fct_id
+        self.name = name
+        self.serial_no = serial_no
+        self.datapoints = datapoints
+
+    def as_dict(self):
+        """Return the topology information of the device."""
+        return {
+            "node_id": self.node_id,
+            "fct_id": self.fct_id,
+            "name": self.name,
+            "serial_no": self.serial_no,
+            "datapoints": self.datapoints,
+        }
+
+    @property
+    def catalog(self):
+        """Return the datapoints a device of this type may report."""
+        return CATALOG[self.fct_type]
+
+    def has(self, datapoint):
+        """Return True unless the device is known not to report a datapoint."""
+        return self.datapoints is None or datapoint in self.datapoints
+
+    async def probe(self, datapoints=None):
+        """Find out which datapoints of the catalog the device reports.
+
+        Only the given datapoints are read if any, the others are reported if
+        their value was read before.
+        """
+        await self.refresh(self.catalog if datapoints is None else datapoints)
+        self.datapoints = [
+            datapoint for datapoint in self.catalog if self.oid(datapoint) in self._table
+        ]
+
+    def oid(self, datapoint):
+        """Return the absolute OID of a datapoint of this device."""
+        return (
+            f"/{MYCOMFORT_SUBNET}/{self.node_id}/{self.fct_id}/{DATAPOINTS[datapoint]}"
+        )
+
+    async def refresh(self, datapoints, interactive=()):
+        """Fetch the given datapoints, one request per subtree when possible.
+
+        Subtrees holding an interactive datapoint are fetched first, with the
+        priority of interactive reads.
+        """
+        subtrees = {}
+        for datapoint in datapoints:
+            oid = self.oid(datapoint)
+            subtrees.setdefault(oid.rsplit("/", 2)[0], {})[oid] = datapoint
+        priorities = {
+            subtree: PRIORITY_INTERACTIVE
+            if any(datapoint in interactive for datapoint in oids.values())
+            else PRIORITY_BACKGROUND
+            for subtree, oids in subtrees.items()
+        }
+
+        for subtree, oids in sorted(
+            subtrees.items(), key=lambda item: priorities[item[0]]
+        ):
+            priority = priorities[subtree]
+            if subtree not in self._no_lookup:
+                try:
+                    self._table.update(
+                        await self._fetch(
+                            oids.values(),
+                            self._gateway.lookup_values(subtree, priority),
+                        )
+                    )
+                    continue
+                except myComfortNotSupportedError:
+                    logger.debug("No subtree lookup for %s, reading datapoints", subtree)
+                    self._no_lookup.add(subtree)
+            for oid, datapoint in oids.items():
+                try:
+                    self._table[oid] = await self._fetch(
+                        [datapoint], self._gateway.read(oid, priority)
+                    )
+                except (ValueError, myComfortNotSupportedError):
+                    self._table.pop(oid, None)
+        self.stale.difference_update(datapoints)
+
+    async def _fetch(self, datapoints, request):
+        """Await a request for some datapoints, recording it per datapoint."""
+        started = time.monotonic()
+        try:
+            result = await request
+        except myComfortNotSupportedError:
+            raise
+        except (myComfortGatewayError, ValueError):
+            self._gateway.stats.record_fetch(
+                datapoints, time.monotonic() - started, error=True
+            )
+            raise
+        self._gateway.stats.record_fetch(datapoints, time.monotonic() - started)
+        return result
+
+    def get(self, datapoint):
+        """Return the decoded value of a datapoint from the last refresh."""
+        try:
+            value = self._table[self.oid(datapoint)]
+        except KeyError as err:
+            raise ValueError(f"{datapoint} was not reported by {self.name}") from err
+        return _decode_value(datapoint, value)
+
+    def implausible(self, datapoints):
+        """Return why the values of reported datapoints do not decode as expected.
+
+        Such a value usually means a wrong address or label in the table.
+        """
+        problems = {}
+        for datapoint in datapoints:
+            oid = self.oid(datapoint)
+            if oid in self._table:
+                problem = _implausible(datapoint, self._table[oid])
+                if problem:
+                    problems[datapoint] = problem
+        return problems
+
+    async def set(self, datapoint, value):
+        """Write a datapoint of this device."""
+        await self.set_many({datapoint: value})
+
+    async def set_many(self, values):
+        """Write several datapoints of this device in one transaction.
+
+        The written values are kept in the table and the datapoints are marked
+        stale, so the next refresh reads them back whatever their tier.
+        """
+        raw = {
+            self.oid(datapoint): _encode_value(datapoint, value)
+            for datapoint, value in values.items()
+        }
+        await self._gateway.write_many(raw)
+        for oid, value in raw.items():
+            self._table[oid] = str(value)
+        self.stale.update(values)
+
+
+class myComfortBoiler(myComfortDevice):
+    """A Windhager boiler."""
+
+    fct_type = FCT_TYPE_BOILER
+
+    async def errors(self, first, last):
+        """Return the error history entries first to last as (number, text).
+
+        Entries are numbered from 1 by the error counter, only the last
+        ERROR_HISTORY_SIZE of them are kept by the boiler. Entries returned by
+        the last subtree lookup are not read again.
+        """
+        entries = []
+        for number in range(max(first, last - ERROR_HISTORY_SIZE + 1, 1), last + 1):
+            oid = (
+                f"/{MYCOMFORT_SUBNET}/{self.node_id}/{self.fct_id}/{ERROR_HISTORY}/"
+                f"{(number - 1) % ERROR_HISTORY_SIZE}"
+            )
+            if oid in self._table:
+                entries.append((number, self._table[oid]))
+            else:
+                entries.append(
+                    (number, await self._fetch(["getErrorHistory"], self._gateway.read(oid)))
+                )
+        return entries
+
+
+class myComfortModule(myComfortDevice):
+    """A heating module, optionally driving a DHW circuit."""
+
+    def __init__(
+        self, gateway, node_id, fct_id, name, serial_no, dhw=False, datapoints=None
+    ):
+        """Initialize the module."""
+        super().__init__(gateway, node_id, fct_id, name, serial_no, datapoints)
+        self._dhw = dhw
+        self._schedules = {}
+        self.fct_type = FCT_TYPE_DHW_CIRCUIT if dhw else FCT_TYPE_HEATING_CIRCUIT
+
+    def as_dict(self):
+        """Return the topology information of the module."""
+        return {**super().as_dict(), "dhw": self._dhw}
+
+    def isDHWCircuit(self):
+        """Return True if the module drives a DHW circuit."""
+        return self._dhw
+
+    async def setMode(self, mode):
+        """Set the operation mode."""
+        await self.set("getOperationMode", mode)
+
+    async def setRoomTemperatureSetpoint(self, temperature, duration=None):
+        """Set the room temperature setpoint, optionally with its duration."""
+        values = {"getRoomTemperatureSetpoint": temperature}
+        if duration is not None:
+            values["getDuration"] = duration
+        await self.set_many(values)
+
+    async def setDuration(self, duration):
+        """Set for how many minutes the setpoint stays active."""
+        await self.set("getDuration", duration)
+
+    def _program_path(self, program):
+        """Return the OID of the level of a weekly program, numbered from 1."""
+        return (
+            f"/{MYCOMFORT_SUBNET}/{self.node_id}/{self.fct_id}/"
+            f"{TIME_PROGRAMS[program - 1]}"
+        )
+
+    def cached_schedule(self, program):
+        """Return a weekly program as last read or written, None if never read."""
+        table = self._schedules.get(program)
+        if table is None:
+            return None
+        return _decode_schedule(table, self._program_path(program))
+
+    async def schedule(self, program, refresh=False):
+        """Return a weekly program as lists of "HH:MM-HH:MM" periods per weekday.
+
+        The whole program is read in one lookup and cached, later calls are
+        served from the cache unless a refresh is asked for.
+        """
+        if refresh or program not in self._schedules:
+            path = self._program_path(program)
+            try:
+                table = await self._fetch(
+                    ["getTimeProgram"], self._gateway.lookup_values(path)
+                )
+            except myComfortNotSupportedError:
+                logger.debug("No lookup of %s, reading its periods", path)
+                table = {}
+                for oid in _encode_schedule(path, {day: [] for day in WEEKDAYS}):
+                    table[oid] = await self._fetch(
+                        ["getTimeProgram"], self._gateway.read(oid)
+                    )
+            self._schedules[program] = table
+        return self.cached_schedule(program)
+
+    async def set_schedule(self, program, schedule):
+        """Write the periods of a weekly program that differ from the cached ones.
+
+        Weekdays missing from the schedule are left as they are. Returns the
+        number of values written.
+        """
+        await self.schedule(program)
+        table = self._schedules[program]
+        # The gateway may answer "360.0" or 360 for the "360" written
+        values = {
+            oid: value
+            for oid, value in _encode_schedule(
+                self._program_path(program), schedule
+            ).items()
+            if _schedule_minute(table.get(oid)) != int(value)
+        }
+        if values:
+            await self._gateway.write_many(values)
+            table.update(values)
+        return len(values)
+
+
+def _encode_schedule(path, schedule):
+    """Return the raw values of the periods of some weekdays, by OID."""
+    values = {}
+    for day, periods in schedule.items():
+        minutes = [0] * (TIME_PROGRAM_PERIODS * 2)
+        for index, period in enumerate(periods):
+            minutes[index * 2 : index * 2 + 2] = [
+                int(hours) * 60 + int(mins)
+                for hours, mins in (clock.split(":") for clock in period.split("-"))
+            ]
+        for instance, minute in enumerate(minutes):
+            values[f"{path}/{WEEKDAYS.index(day)}/{instance}"] = str(minute)
+    return values
+
+
+def _decode_schedule(table, path):
+    """Return the used periods of every weekday from the raw values of a program."""
+    schedule = {}
+    for object_id, day in enumerate(WEEKDAYS):
+        schedule[day] = []
+        for period in range(TIME_PROGRAM_PERIODS):
+            start, end = (
+                _schedule_minute(table.get(f"{path}/{object_id}/{period * 2 + offset}"))
+                for offset in (0, 1)
+            )
+            if start is not None and end is not None and start < end:
+                schedule[day].append(
+                    f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+                )
+    return schedule
+
+
+def _schedule_minute(value):
+    """Return the minute of a raw period value, None if it is not a number."""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _collect_values(tree, values):
+    """Gather the OID/value pairs of a lookup answer into a flat table."""
+    if isinstance(tree, dict):
+        if "OID" in tree and "value" in tree:
+            values[tree["OID"]] = tree["value"]
+        for child in tree.values():
+            if isinstance(child, (dict, list)):
+                _collect_values(child, values)
+    elif isinstance(tree, list):
+        for child in tree:
+            _collect_values(child, values)
+
+
+def _decode_value(datapoint, value):
+    """Translate a raw gateway value into the value the entities expect.
+
+    Numbers that are not reported as such, e.g. sensor errors, become None.
+    """
+    if datapoint in DATAPOINTS_ENUM:
+        labels = DATAPOINTS_ENUM[datapoint]
+        try:
+            return labels[int(float(value))]
+        except (IndexError, TypeError, ValueError):
+            return value
+    if datapoint in DATAPOINTS_FLAG:
+        return value not in ("0", "0.0", 0, None)
+    if datapoint in DATAPOINTS_TEXT:
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _implausible(datapoint, value):
+    """Return why a raw value does not decode as its datapoint expects, if it does not."""
+    if datapoint in DATAPOINTS_ENUM:
+        if _decode_value(datapoint, value) not in DATAPOINTS_ENUM[datapoint]:
+            return f"no label for {value!r}"
+    elif datapoint in DATAPOINTS_FLAG:
+        if str(value) not in ("0", "1", "0.0", "1.0"):
+            return f"{value!r} is not a 0/1 flag"
+    elif datapoint not in DATAPOINTS_TEXT and _decode_value(datapoint, value) is None:
+        return f"{value!r} is not a number"
+    return None
+
+
+def _encode_value(datapoint, value):
+    """Translate an entity value into the raw gateway value."""
+    if datapoint in DATAPOINTS_ENUM:
+        return DATAPOINTS_ENUM[datapoint].index(value)
+    return value
@@ -0,0 +1,105 @@
+"""In-memory time series of the myComfort sensors."""
+from array import array
+import math
+
+# (bucket period in seconds, number of buckets) of each downsampling level
+HISTORY_LEVELS = [
+    (60, 120),
+    (900, 96),
+    (3600, 168),
+]
+
+
+class myComfortRing:
+    """Fixed size ring of min/mean/max buckets of one period."""
+
+    __slots__ = ("period", "size", "head", "used", "start", "low", "high", "total", "count")
+
+    def __init__(self, period, size):
+        """Initialize an empty ring."""
+        self.period = period
+        self.size = size
+        self.head = -1
+        self.used = 0
+        self.start = array("d", [0.0] * size)
+        self.low = array("f", [0.0] * size)
+        self.high = array("f", [0.0] * size)
+        self.total = array("d", [0.0] * size)
+        self.count = array("I", [0] * size)
+
+    def add(self, timestamp, value):
+        """Add a value to the bucket of its timestamp."""
+        start = math.floor(timestamp / self.period) * self.period
+        head = self.head
+        if self.used and start == self.start[head]:
+            self.low[head] = min(self.low[head], value)
+            self.high[head] = max(self.high[head], value)
+            self.total[head] += value
+            self.count[head] += 1
+            return
+        if self.used and start < self.start[head]:
+            # Never rewrite a bucket that was already closed
+            return
+        head = self.head = (head + 1) % self.size
+        self.used = min(self.used + 1, self.size)
+        self.start[head] = start
+        self.low[head] = self.high[head] = self.total[head] = value
+        self.count[head] = 1
+
+    @property
+    def oldest(self):
+        """Return the start of the oldest bucket, or None if empty."""
+        if not self.used:
+            return None
+        return self.start[(self.head - self.used + 1) % self.size]
+
+    def query(self, start, end):
+        """Return the (start, min, mean, max) buckets overlapping a range."""
+        buckets = []
+        for offset in range(self.used - 1, -1, -1):
+            index = (self.head - offset) % self.size
+            bucket = self.start[index]
+            if bucket + self.period <= start or bucket > end:
+                continue
+            buckets.append(
+                (
+                    bucket,
+                    round(self.low[index], 2),
+                    round(self.total[index] / self.count[index], 2),
+                    round(self.high[index], 2),
+                )
+            )
+        return buckets
+
+
+class myComfortHistory:
+    """Downsampled history of every sensor of a gateway, in fixed memory."""
+
+    def __init__(self):
+        """Initialize the history."""
+        self._series = {}
+
+    def __contains__(self, entity_id):
+        """Return True if the history has values of an entity."""
+        return entity_id in self._series
+
+    def add(self, entity_id, timestamp, value):
+        """Add a value of an entity to every level."""
+        levels = self._series.get(entity_id)
+        if levels is None:
+            levels = self._series[entity_id] = [
+                myComfortRing(period, size) for period, size in HISTORY_LEVELS
+            ]
+        for ring in levels:
+            ring.add(timestamp, value)
+
+    def query(self, entity_id, start, end):
+        """Return the finest level covering a range, and its buckets."""
+        levels = self._series.get(entity_id)
+        if not levels:
+            return None, []
+        for ring in levels:
+            # A ring that has not wrapped yet holds everything recorded so far
+            if ring.used < ring.size or ring.oldest <= start:
+                break
+        return ring.period, ring.query(start, end)
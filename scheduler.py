@@ -0,0 +1,103 @@
+"""Request scheduler of a Windhager myComfort gateway."""
+import asyncio
+import heapq
+import itertools
+import time
+
+PRIORITY_WRITE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITIES = {
+    PRIORITY_WRITE: "write",
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class myComfortScheduler:
+    """Send the requests of one gateway by priority, within a request budget.
+
+    At most `concurrency` requests are in flight, started at most `rate` times
+    per second. Queued requests start by priority, then in order of arrival;
+    a request with the same key as a queued one waits for its result instead
+    of being queued again, moving it up to its own priority if more urgent.
+    """
+
+    def __init__(self, concurrency, rate=None, stats=None):
+        """Initialize an empty queue."""
+        self._concurrency = concurrency
+        self._interval = 1 / rate if rate else 0
+        self._stats = stats
+        self._queue = []
+        self._queued = {}
+        self._order = itertools.count()
+        self._running = 0
+        self._next_start = 0.0
+        self._timer = None
+        self._tasks = set()
+
+    async def run(self, send, priority, key=None):
+        """Queue a request coroutine function and return its result."""
+        if key is not None and key in self._queued:
+            if self._stats is not None:
+                self._stats.merged += 1
+            self._promote(key, priority)
+            return await asyncio.shield(self._queued[key])
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._queue,
+            (priority, next(self._order), time.monotonic(), send, future, key),
+        )
+        if key is not None:
+            self._queued[key] = future
+        self._dispatch()
+        return await asyncio.shield(future)
+
+    def _promote(self, key, priority):
+        """Give a queued request a more urgent priority."""
+        for index, entry in enumerate(self._queue):
+            if entry[5] == key:
+                if priority < entry[0]:
+                    self._queue[index] = (priority, *entry[1:])
+                    heapq.heapify(self._queue)
+                return
+
+    def _dispatch(self):
+        """Start the queued requests the concurrency and budget allow."""
+        loop = asyncio.get_running_loop()
+        while self._queue and self._running < self._concurrency:
+            now = time.monotonic()
+            if now < self._next_start:
+                if self._timer is None:
+                    self._timer = loop.call_later(
+                        self._next_start - now, self._wake_up
+                    )
+                return
+            priority, _, queued, send, future, key = heapq.heappop(self._queue)
+            if key is not None:
+                del self._queued[key]
+            if self._stats is not None:
+                self._stats.record_wait(PRIORITIES[priority], now - queued)
+            self._next_start = max(now, self._next_start) + self._interval
+            self._running += 1
+            task = loop.create_task(self._send(send, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _wake_up(self):
+        """Resume dispatching once the budget allows a new request."""
+        self._timer = None
+        self._dispatch()
+
+    async def _send(self, send, future):
+        """Run one request, handing its outcome to every waiter."""
+        try:
+            result = await send()
+        except Exception as err:  # pylint: disable=broad-except
+            future.set_exception(err)
+        else:
+            future.set_result(result)
+        finally:
+            self._running -= 1
+            self._dispatch()
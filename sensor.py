@@ -1,8 +1,7 @@
 """Windhager myComfort sensor device."""
 import logging
 from datetime import timedelta
-
-import requests
+import time
 
 from homeassistant.const import (
     CONF_DEVICE_CLASS,
@@ -11,24 +10,57 @@ from homeassistant.const import (
     CONF_SCAN_INTERVAL,
     CONF_UNIT_OF_MEASUREMENT,
     DEVICE_CLASS_TEMPERATURE,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
     MASS_KILOGRAMS,
     PERCENTAGE,
     TEMP_CELSIUS,
     TIME_HOURS,
+    TIME_MINUTES,
 )
-from homeassistant.helpers.entity import Entity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import (
+    ATTR_RESTORED,
     DOMAIN as MYCOMFORT_DOMAIN,
-    MYCOMFORT_ERROR,
-    MYCOMFORT_API,
+    MYCOMFORT_COORDINATOR,
     MYCOMFORT_NAME,
+    MYCOMFORT_SENSOR_TIERS,
+    MYCOMFORT_HISTORY,
     SCAN_INTERVAL,
+    SIGNAL_NEW_DATAPOINTS,
+    SIGNAL_NEW_DEVICES,
 )
+from .derived import DERIVED_COUNTERS
+from .coordinator import TIER_DAILY, TIER_FAST, TIER_HOURLY, TIER_NORMAL
 
 logger = logging.getLogger(MYCOMFORT_DOMAIN)
 
-CONF_GETTER = "getter"
+CONF_DATAPOINT = "datapoint"
+CONF_SCALE = "scale"
+CONF_TIER = "tier"
+CONF_DEADBAND = "deadband"
+CONF_DERIVED = "derived"
+CONF_DATAPOINTS = "datapoints"
+CONF_ALARM_LOG = "alarm_log"
+
+ATTR_ALARM_LOG = "alarm_log"
+
+# Period of the diagnostics sensor, and the figures it shows; the others are
+# only given by the dump_stats service
+DIAGNOSTICS_INTERVAL = timedelta(minutes=10)
+DIAGNOSTICS_ATTRIBUTES = [
+    "errors",
+    "cache_hit_ratio",
+    "merged_reads",
+    "latency_p50_ms",
+    "latency_p95_ms",
+]
 
 SENSOR_TYPE_TEMPERATURE = "temperature"
 
@@ -47,6 +79,12 @@ SENSOR_BOILER_TIME_MAIN_CLEANING = "boiler_time_main_cleaning"
 SENSOR_BOILER_TIME_MAINTENANCE = "boiler_time_maintenance"
 SENSOR_BOILER_ALARM = "boiler_alarm"
 
+# boiler sensors derived from the counters
+SENSOR_CONSUMPTION_RATE = "consumption_rate"
+SENSOR_DUTY_CYCLE = "duty_cycle"
+SENSOR_RUN_LENGTH = "run_length"
+SENSOR_HOURS_UNTIL_MAINTENANCE = "hours_until_maintenance"
+
 # module sensors
 SENSOR_OUTSIDE_TEMPERATURE = "outside_temperature"
 SENSOR_FLOW_TEMPERATURE = "flow_temperature"
@@ -61,194 +99,291 @@ SENSOR_TYPES = {
         CONF_NAME: "Exhaust Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getExhaustTemperature(),
+        CONF_DATAPOINT: "getExhaustTemperature",
+        CONF_TIER: TIER_FAST,
+        CONF_DEADBAND: 1.0,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_BUFFER_TEMPERATURE: {
         CONF_NAME: "Buffer Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getBufferTemperature(),
+        CONF_DATAPOINT: "getBufferTemperature",
+        CONF_TIER: TIER_NORMAL,
+        CONF_DEADBAND: 0.5,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_BOILER_TEMPERATURE: {
         CONF_NAME: "Boiler Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getBoilerTemperature(),
+        CONF_DATAPOINT: "getBoilerTemperature",
+        CONF_TIER: TIER_FAST,
+        CONF_DEADBAND: 0.5,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_BOILER_SETPOINT_TEMPERATURE: {
         CONF_NAME: "Boiler Setpoint Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getBoilerSetpointTemperature(),
+        CONF_DATAPOINT: "getBoilerSetpointTemperature",
+        CONF_TIER: TIER_NORMAL,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_BURNER_MODULATION: {
         CONF_NAME: "Burner modulation",
         CONF_ICON: "mdi:percent",
         CONF_UNIT_OF_MEASUREMENT: PERCENTAGE,
-        CONF_GETTER: lambda api: api.getBurnerModulation(),
+        CONF_DATAPOINT: "getBurnerModulation",
+        CONF_TIER: TIER_FAST,
+        CONF_DEADBAND: 2,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_CONSUMPTION_BULKFILL: {
         CONF_NAME: "Pellet consumption since bulk fill",
         CONF_ICON: "mdi:power",
         CONF_UNIT_OF_MEASUREMENT: MASS_KILOGRAMS,
-        CONF_GETTER: lambda api: int(float(api.getBoilerConsumptionBulkfill()) * 1000),
+        CONF_DATAPOINT: "getBoilerConsumptionBulkfill",
+        CONF_SCALE: 1000,
+        CONF_TIER: TIER_HOURLY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_CONSUMPTION_TOTAL: {
         CONF_NAME: "Pellet consumption total",
         CONF_ICON: "mdi:power",
         CONF_UNIT_OF_MEASUREMENT: MASS_KILOGRAMS,
-        CONF_GETTER: lambda api: int(float(api.getBoilerConsumptionTotal()) * 1000),
+        CONF_DATAPOINT: "getBoilerConsumptionTotal",
+        CONF_SCALE: 1000,
+        CONF_TIER: TIER_HOURLY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_TIME_CLEANING: {
         CONF_NAME: "Boiler Operating Time Cleaning",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
-        CONF_GETTER: lambda api: api.getOperatingTimeCleaning(),
+        CONF_DATAPOINT: "getOperatingTimeCleaning",
+        CONF_TIER: TIER_DAILY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_TIME_MAIN_CLEANING: {
         CONF_NAME: "Boiler Operating Time Main Cleaning",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
-        CONF_GETTER: lambda api: api.getOperatingTimeMainCleaning(),
+        CONF_DATAPOINT: "getOperatingTimeMainCleaning",
+        CONF_TIER: TIER_DAILY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_TIME_MAINTENANCE: {
         CONF_NAME: "Boiler Operating Time Maintenance",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
-        CONF_GETTER: lambda api: api.getOperatingTimeMaintenance(),
+        CONF_DATAPOINT: "getOperatingTimeMaintenance",
+        CONF_TIER: TIER_DAILY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BURNER_STARTS: {
         CONF_NAME: "Burner Starts",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.getBurnerStarts(),
+        CONF_DATAPOINT: "getBurnerStarts",
+        CONF_TIER: TIER_HOURLY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BURNER_HOURS: {
         CONF_NAME: "Burner Hours",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
-        CONF_GETTER: lambda api: api.getBurnerHours(),
+        CONF_DATAPOINT: "getBurnerHours",
+        CONF_TIER: TIER_HOURLY,
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_BOILER_ALARM: {
         CONF_NAME: "Boiler Alarm",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.getAlarmText(),
+        CONF_DATAPOINT: "getAlarmText",
+        # Shares the lookup of the boiler temperatures, so a cleared alarm
+        # goes away without extra requests
+        CONF_TIER: TIER_NORMAL,
+        CONF_DEVICE_CLASS: None,
+        CONF_ALARM_LOG: True,
+    },
+    SENSOR_CONSUMPTION_RATE: {
+        CONF_NAME: "Pellet consumption rate",
+        CONF_ICON: "mdi:speedometer",
+        CONF_UNIT_OF_MEASUREMENT: f"{MASS_KILOGRAMS}/h",
+        CONF_DERIVED: "consumption_rate",
+        CONF_DATAPOINTS: DERIVED_COUNTERS,
+        CONF_DEADBAND: 0.05,
+        CONF_DEVICE_CLASS: None,
+    },
+    SENSOR_DUTY_CYCLE: {
+        CONF_NAME: "Burner duty cycle",
+        CONF_ICON: "mdi:percent",
+        CONF_UNIT_OF_MEASUREMENT: PERCENTAGE,
+        CONF_DERIVED: "duty_cycle",
+        CONF_DATAPOINTS: DERIVED_COUNTERS,
+        CONF_DEADBAND: 1,
+        CONF_DEVICE_CLASS: None,
+    },
+    SENSOR_RUN_LENGTH: {
+        CONF_NAME: "Burner run length",
+        CONF_ICON: "mdi:timer-outline",
+        CONF_UNIT_OF_MEASUREMENT: TIME_MINUTES,
+        CONF_DERIVED: "run_length",
+        CONF_DATAPOINTS: DERIVED_COUNTERS,
+        CONF_DEADBAND: 1,
+        CONF_DEVICE_CLASS: None,
+    },
+    SENSOR_HOURS_UNTIL_MAINTENANCE: {
+        CONF_NAME: "Hours until maintenance",
+        CONF_ICON: "mdi:wrench-clock",
+        CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
+        CONF_DERIVED: "hours_until_maintenance",
+        CONF_DATAPOINTS: DERIVED_COUNTERS + ["getOperatingTimeMaintenance"],
         CONF_DEVICE_CLASS: None,
     },
     SENSOR_OUTSIDE_TEMPERATURE: {
         CONF_NAME: "Outside Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getOutsideTemperature(),
+        CONF_DATAPOINT: "getOutsideTemperature",
+        CONF_TIER: TIER_NORMAL,
+        CONF_DEADBAND: 0.2,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_FLOW_TEMPERATURE: {
         CONF_NAME: "Flow Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getFlowTemperature(),
+        CONF_DATAPOINT: "getFlowTemperature",
+        CONF_TIER: TIER_FAST,
+        CONF_DEADBAND: 0.5,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_FLOW_SETPOINT_TEMPERATURE: {
         CONF_NAME: "Flow Setpoint Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getFlowSetpointTemperature(),
+        CONF_DATAPOINT: "getFlowSetpointTemperature",
+        CONF_TIER: TIER_NORMAL,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_DHW_TEMPERATURE: {
         CONF_NAME: "DHW Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getDHWTemperature(),
+        CONF_DATAPOINT: "getDHWTemperature",
+        CONF_TIER: TIER_NORMAL,
+        CONF_DEADBAND: 0.5,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
     SENSOR_DHW_SETPOINT_TEMPERATURE: {
         CONF_NAME: "DHW Setpoint Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.getDHWSetpointTemperature(),
+        CONF_DATAPOINT: "getDHWSetpointTemperature",
+        CONF_TIER: TIER_NORMAL,
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
     },
 }
 
 SENSORS_BOILER = [SENSOR_BOILER_TEMPERATURE, SENSOR_BOILER_SETPOINT_TEMPERATURE, SENSOR_BURNER_MODULATION, SENSOR_BURNER_STARTS, SENSOR_BURNER_HOURS, SENSOR_EXHAUST_TEMPERATURE, SENSOR_BUFFER_TEMPERATURE, SENSOR_BOILER_CONSUMPTION_BULKFILL, SENSOR_BOILER_CONSUMPTION_TOTAL, SENSOR_BOILER_TIME_CLEANING, SENSOR_BOILER_TIME_MAIN_CLEANING, SENSOR_BOILER_TIME_MAINTENANCE, SENSOR_BOILER_ALARM]
+SENSORS_BOILER_DERIVED = [SENSOR_CONSUMPTION_RATE, SENSOR_DUTY_CYCLE, SENSOR_RUN_LENGTH, SENSOR_HOURS_UNTIL_MAINTENANCE]
 SENSORS_MODULE = [SENSOR_OUTSIDE_TEMPERATURE, SENSOR_FLOW_TEMPERATURE, SENSOR_FLOW_SETPOINT_TEMPERATURE]
 SENSORS_DHW = [SENSOR_DHW_TEMPERATURE, SENSOR_DHW_SETPOINT_TEMPERATURE]
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Create the mycomfort sensor devices."""
     if discovery_info is None:
         return
 
-    mycomfort_api = hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_API]
+    gateway = hass.data[MYCOMFORT_DOMAIN][discovery_info[MYCOMFORT_NAME]]
+    coordinator = gateway[MYCOMFORT_COORDINATOR]
+    sensor_tiers = gateway[MYCOMFORT_SENSOR_TIERS]
 
-    sensors = SENSORS_BOILER.copy()
+    for sensor_type, sensor in SENSOR_TYPES.items():
+        if CONF_DERIVED in sensor:
+            continue
+        coordinator.set_tier(
+            sensor[CONF_DATAPOINT], sensor_tiers.get(sensor_type, sensor[CONF_TIER])
+        )
 
-    for boiler in mycomfort_api.boilers():
-        add_entities(
-            [
-                myComfortSensor(hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_NAME] + " " + boiler.name, boiler, sensor)
-                for sensor in sensors
-            ]
+    name = gateway[MYCOMFORT_NAME]
+    history = gateway[MYCOMFORT_HISTORY]
+    added = set()
 
-        )
+    @callback
+    def async_add_devices(boilers, modules):
+        """Add the sensors of boilers and modules, for the datapoints they report.
 
-    sensors = SENSORS_MODULE.copy()
+        Sensors already added are skipped, so devices reporting new datapoints
+        can be passed again.
+        """
+        entities = []
+        for boiler in boilers:
+            entities += [
+                myComfortSensor(
+                    f"{name} {boiler.name}", coordinator, boiler, sensor, history
+                )
+                for sensor in SENSORS_BOILER + SENSORS_BOILER_DERIVED
+                if all(map(boiler.has, _datapoints(SENSOR_TYPES[sensor])))
+            ]
 
-    for module in mycomfort_api.modules():
-        add_entities(
-            [
-                myComfortSensor(hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_NAME] + " " + module.name, module, sensor)
+        for module in modules:
+            sensors = SENSORS_MODULE.copy()
+            if module.isDHWCircuit():
+                logger.debug("Module " + module.name + " is a DHW circuit!")
+                sensors += SENSORS_DHW
+            entities += [
+                myComfortSensor(
+                    f"{name} {module.name}", coordinator, module, sensor, history
+                )
                 for sensor in sensors
+                if all(map(module.has, _datapoints(SENSOR_TYPES[sensor])))
             ]
-        )
+        entities = [entity for entity in entities if entity.unique_id not in added]
+        added.update(entity.unique_id for entity in entities)
+        async_add_entities(entities)
+
+    async_add_entities([myComfortDiagnosticsSensor(name, coordinator)])
+    async_add_devices(coordinator.boilers, coordinator.modules)
+    async_dispatcher_connect(hass, SIGNAL_NEW_DEVICES.format(name), async_add_devices)
+    async_dispatcher_connect(
+        hass, SIGNAL_NEW_DATAPOINTS.format(name), async_add_devices
+    )
 
-        if module.isDHWCircuit():
-            logger.debug("Module " + module.name + " is a DHW circuit!")
-            sensors_dhw = SENSORS_DHW.copy()
-            add_entities(
-                [
-                    myComfortSensor(hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_NAME] + " " + module.name, module, sensor)
-                    for sensor in sensors_dhw
-                ]
-            )
 
+def _datapoints(sensor):
+    """Return the datapoints a sensor is computed from."""
+    return sensor.get(CONF_DATAPOINTS, [sensor.get(CONF_DATAPOINT)])
 
 
-class myComfortSensor(Entity):
+class myComfortSensor(CoordinatorEntity, RestoreEntity):
     """Representation of a myComfort sensor."""
 
-    def __init__(self, name, api, sensor_type):
+    def __init__(self, name, coordinator, api, sensor_type, history=None):
         """Initialize the sensor."""
+        super().__init__(coordinator)
         self._sensor = SENSOR_TYPES[sensor_type]
         self._name = f"{name} {self._sensor[CONF_NAME]}"
         self._api = api
+        self._history = history
         self._sensor_type = sensor_type
         self._state = None
+        self._restored = False
+        self._published_available = None
+        self._alarm_cursor = None
 
     @property
     def available(self):
         """Return True if entity is available."""
-        return self._state is not None and self._state != MYCOMFORT_ERROR
+        return self.coordinator.available(self._api) and self._state is not None
 
     @property
     def unique_id(self):
         """Return a unique ID."""
-        return f"{self._api.serial_no}-{self._sensor_type}"
+        return f"{self.coordinator.name}-{self._api.serial_no}-{self._sensor_type}"
 
     @property
     def name(self):
@@ -275,11 +410,178 @@ class myComfortSensor(Entity):
         """Return the class of this device, from component DEVICE_CLASSES."""
         return self._sensor[CONF_DEVICE_CLASS]
 
-    def update(self):
-        """Update state of sensor."""
+    @property
+    def extra_state_attributes(self):
+        """Flag a value restored from before the restart, and list the alarms."""
+        attributes = {}
+        if self._restored:
+            attributes[ATTR_RESTORED] = True
+        if CONF_ALARM_LOG in self._sensor:
+            attributes[ATTR_ALARM_LOG] = list(self.coordinator.alarms(self._api).log)
+        return attributes or None
+
+    async def async_added_to_hass(self):
+        """Add the datapoints to the fetch plan and read the current snapshot.
+
+        Without a value yet, the state saved before the restart is shown until
+        the datapoint is fetched.
+        """
+        await super().async_added_to_hass()
+        self._state = self._value_from_snapshot()
+        if self._state is None:
+            last_state = await self.async_get_last_state()
+            if last_state is not None and last_state.state not in (
+                STATE_UNKNOWN,
+                STATE_UNAVAILABLE,
+            ):
+                self._state = last_state.state
+                self._restored = True
+        self.async_on_remove(
+            self.coordinator.async_want(
+                self._api, _datapoints(self._sensor), self._restored
+            )
+        )
+        self._published_available = self.coordinator.available(self._api)
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Publish the snapshot value only if it changed beyond the deadband."""
+        state = self._value_from_snapshot()
+        available = self.coordinator.available(self._api)
+        if self._history is not None and available:
+            self._record(state)
+        if CONF_DERIVED in self._sensor:
+            # Derived values are None until their window holds enough samples
+            restored = self._restored and state is None
+        else:
+            restored = self._restored and not self.coordinator.fetched(
+                self._api, [self._sensor[CONF_DATAPOINT]]
+            )
+        if restored:
+            state = self._state
+        alarm_cursor = self._alarm_cursor
+        if CONF_ALARM_LOG in self._sensor:
+            alarm_cursor = self.coordinator.alarms(self._api).cursor
+        if (
+            available == self._published_available
+            and restored == self._restored
+            and alarm_cursor == self._alarm_cursor
+            and not self._changed(state)
+        ):
+            return
+        self._state = state
+        self._restored = restored
+        self._published_available = available
+        self._alarm_cursor = alarm_cursor
+        self.async_write_ha_state()
+
+    def _record(self, state):
+        """Add a numeric value to the buffered history at poll rate."""
         try:
-            self._state = self._sensor[CONF_GETTER](self._api)
-        except requests.exceptions.ConnectionError:
-            logger.error("Unable to retrieve data from myComfort gateway")
-        except ValueError:
-            logger.error("Unable to decode data from myComfort gateway")
+            value = float(state)
+        except (TypeError, ValueError):
+            return
+        self._history.add(self.entity_id, time.time(), value)
+
+    def _changed(self, state):
+        """Return True if a value differs enough from the published one."""
+        if state == self._state:
+            return False
+        deadband = self._sensor.get(CONF_DEADBAND)
+        if deadband is None:
+            return True
+        try:
+            return abs(float(state) - float(self._state)) >= deadband
+        except (TypeError, ValueError):
+            return True
+
+    def _value_from_snapshot(self):
+        """Return the value of the sensor in the coordinator snapshot."""
+        if CONF_DERIVED in self._sensor:
+            return getattr(
+                self.coordinator.derived(self._api), self._sensor[CONF_DERIVED]
+            )
+        value = self.coordinator.snapshot(self._api).get(self._sensor[CONF_DATAPOINT])
+        scale = self._sensor.get(CONF_SCALE)
+        return int(value * scale) if scale and value is not None else value
+
+
+class myComfortDiagnosticsSensor(CoordinatorEntity):
+    """Request statistics of a myComfort gateway.
+
+    The figures change on every cycle, so they are only published every
+    DIAGNOSTICS_INTERVAL, or when the activity changes.
+    """
+
+    def __init__(self, name, coordinator):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._name = f"{name} Gateway diagnostics"
+        self._stats = coordinator.api.stats
+        self._activity = None
+
+    async def async_added_to_hass(self):
+        """Publish the statistics periodically."""
+        await super().async_added_to_hass()
+        self._activity = self.coordinator.activity
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass, self._async_publish, DIAGNOSTICS_INTERVAL
+            )
+        )
+
+    @callback
+    def _async_publish(self, now=None):
+        """Publish the current statistics."""
+        self._activity = self.coordinator.activity
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Publish between periods only when the activity changed."""
+        if self.coordinator.activity != self._activity:
+            self._async_publish()
+
+    @property
+    def unique_id(self):
+        """Return a unique ID."""
+        return f"{self.coordinator.name}-diagnostics"
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return "mdi:chart-bell-curve"
+
+    @property
+    def entity_category(self):
+        """Return the category of the sensor."""
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def available(self):
+        """Return True, the statistics are meaningful when the gateway is down."""
+        return True
+
+    @property
+    def state(self):
+        """Return the number of requests sent to the gateway."""
+        return self._stats.requests
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return "requests"
+
+    @property
+    def extra_state_attributes(self):
+        """Return the headline request statistics."""
+        summary = self._stats.summary()
+        return {
+            **{attribute: summary[attribute] for attribute in DIAGNOSTICS_ATTRIBUTES},
+            "activity": self.coordinator.activity,
+        }
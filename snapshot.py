@@ -0,0 +1,41 @@
+"""Decoded values of a Windhager myComfort device."""
+
+
+class myComfortSnapshot:
+    """Values of the fetched datapoints of a device, decoded once per fetch.
+
+    Snapshots of a device share the index of its fetch plan and hold their
+    values in a tuple. A snapshot whose values did not change is reused, so
+    entities can tell nothing changed by its identity.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        """Initialize a snapshot from a datapoint index and its values."""
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, datapoint):
+        """Return the value of a datapoint, raising KeyError if not fetched."""
+        return self._values[self._index[datapoint]]
+
+    def __contains__(self, datapoint):
+        """Return True if the datapoint is in the fetch plan."""
+        return datapoint in self._index
+
+    def get(self, datapoint, default=None):
+        """Return the value of a datapoint, or a default if not fetched."""
+        index = self._index.get(datapoint)
+        return default if index is None else self._values[index]
+
+    def indexed(self, index):
+        """Return True if the snapshot was built for this datapoint index."""
+        return self._index is index
+
+    def same(self, index, values):
+        """Return True if the snapshot holds exactly these values."""
+        return self._index is index and self._values == values
+
+
+EMPTY_SNAPSHOT = myComfortSnapshot({}, ())
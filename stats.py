@@ -0,0 +1,178 @@
+"""Request instrumentation for the Windhager myComfort gateway."""
+from bisect import bisect_left
+from collections import defaultdict
+
+import aiohttp
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class myComfortHistogram:
+    """Latency histogram with fixed buckets."""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def add(self, duration):
+        """Record a duration in seconds."""
+        milliseconds = duration * 1000
+        self.counts[bisect_left(LATENCY_BUCKETS, milliseconds)] += 1
+        self.total += milliseconds
+
+    @property
+    def count(self):
+        """Return the number of recorded durations."""
+        return sum(self.counts)
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding a percentile, in ms."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + [None], self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        """Return the histogram as bucket label to count."""
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS] + [
+            f">{LATENCY_BUCKETS[-1]}ms"
+        ]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "mean_ms": round(self.total / self.count, 1) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+        }
+
+
+class myComfortDatapointStats:
+    """Counters of one datapoint."""
+
+    __slots__ = ("requests", "errors", "hits", "misses", "latency")
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.requests = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency = myComfortHistogram()
+
+    def as_dict(self):
+        """Return the counters as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "latency": self.latency.as_dict(),
+        }
+
+
+class myComfortStats:
+    """Request counts, errors, cache ratios and latencies of one gateway."""
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self.requests = 0
+        self.errors = 0
+        self.challenges = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.merged = 0
+        self.latency = myComfortHistogram()
+        self.waits = defaultdict(myComfortHistogram)
+        self.datapoints = defaultdict(myComfortDatapointStats)
+
+    def trace_config(self):
+        """Return an aiohttp trace config counting new and reused connections."""
+
+        async def on_connection_create_end(session, context, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def record_request(self, duration, error=False):
+        """Record one HTTP request to the gateway."""
+        self.requests += 1
+        self.errors += error
+        self.latency.add(duration)
+
+    def record_wait(self, priority, duration):
+        """Record how long a request of a priority waited in the queue."""
+        self.waits[priority].add(duration)
+
+    def record_fetch(self, datapoints, duration, error=False):
+        """Record the request that fetched some datapoints."""
+        for datapoint in datapoints:
+            stats = self.datapoints[datapoint]
+            stats.requests += 1
+            stats.errors += error
+            stats.latency.add(duration)
+
+    def record_cache(self, datapoint, hit):
+        """Record whether a datapoint was served without fetching it."""
+        if hit:
+            self.datapoints[datapoint].hits += 1
+        else:
+            self.datapoints[datapoint].misses += 1
+
+    @property
+    def cache_hit_ratio(self):
+        """Return the share of datapoints served without a fetch."""
+        hits = sum(stats.hits for stats in self.datapoints.values())
+        lookups = hits + sum(stats.misses for stats in self.datapoints.values())
+        return round(hits / lookups, 3) if lookups else None
+
+    def summary(self):
+        """Return the headline figures."""
+        slowest = sorted(
+            (
+                (stats.latency.total / stats.latency.count, datapoint)
+                for datapoint, stats in self.datapoints.items()
+                if stats.latency.count
+            ),
+            reverse=True,
+        )
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cache_hit_ratio": self.cache_hit_ratio,
+            "auth_challenges": self.challenges,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "merged_reads": self.merged,
+            "queue_wait_p95_ms": {
+                priority: histogram.percentile(0.95)
+                for priority, histogram in sorted(self.waits.items())
+            },
+            "latency_p50_ms": self.latency.percentile(0.5),
+            "latency_p95_ms": self.latency.percentile(0.95),
+            "slowest_datapoints": [datapoint for _, datapoint in slowest[:5]],
+        }
+
+    def as_dict(self):
+        """Return all the statistics."""
+        return {
+            **self.summary(),
+            "latency": self.latency.as_dict(),
+            "datapoints": {
+                datapoint: stats.as_dict()
+                for datapoint, stats in sorted(self.datapoints.items())
+            },
+        }
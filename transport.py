@@ -0,0 +1,137 @@
+"""Recording and replay of the traffic of a Windhager myComfort gateway."""
+import asyncio
+from collections import Counter, defaultdict
+import gzip
+import json
+import time
+
+from .gateway import (
+    myComfortAuthError,
+    myComfortGatewayError,
+    myComfortNotSupportedError,
+)
+
+RECORDING_VERSION = 1
+
+# Outcome recorded for each kind of failed request
+RECORDED_ERRORS = {
+    "auth": myComfortAuthError,
+    "unsupported": myComfortNotSupportedError,
+    "error": myComfortGatewayError,
+}
+
+
+def _open(path, mode):
+    """Open a recording, gzip compressed if its name ends with .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_recording(path):
+    """Return the exchanges of a recording file."""
+    with _open(path, "r") as file:
+        header = json.loads(file.readline())
+        if header.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported myComfort recording version in {path}")
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class myComfortRecorder:
+    """Record every exchange of a gateway transport, with its timing.
+
+    Each exchange is one JSON line [start, duration, method, path, payload,
+    outcome, answer], start being in seconds since the recording began. A
+    request that failed for any reason is recorded with its error as answer.
+    Exchanges are kept in memory until taken and written to the file.
+    """
+
+    def __init__(self, path):
+        """Initialize a recorder writing to a file, replacing it."""
+        self.path = path
+        self._started = time.monotonic()
+        self._pending = []
+        self._created = False
+
+    def wrap(self, send):
+        """Return a transport recording the exchanges of another one."""
+
+        async def record(method, path, payload=None):
+            started = time.monotonic()
+            outcome, answer = "ok", None
+            try:
+                answer = await send(method, path, payload)
+                return answer
+            except myComfortGatewayError as err:
+                outcome = next(
+                    outcome
+                    for outcome, error in RECORDED_ERRORS.items()
+                    if isinstance(err, error)
+                )
+                answer = str(err)
+                raise
+            except BaseException as err:
+                # Any other failure, or a cancellation, is replayed as an error
+                outcome, answer = "error", str(err) or type(err).__name__
+                raise
+            finally:
+                self._pending.append(
+                    [
+                        round(started - self._started, 3),
+                        round(time.monotonic() - started, 4),
+                        method,
+                        path,
+                        payload,
+                        outcome,
+                        answer,
+                    ]
+                )
+
+        return record
+
+    def take(self):
+        """Return the exchanges not written yet, forgetting them."""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def write(self, exchanges):
+        """Append exchanges to the file, doing blocking I/O."""
+        with _open(self.path, "a" if self._created else "w") as file:
+            if not self._created:
+                file.write(json.dumps({"version": RECORDING_VERSION}) + "\n")
+                self._created = True
+            for exchange in exchanges:
+                file.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+
+
+class myComfortReplay:
+    """Transport answering from a recording instead of a gateway.
+
+    The answers to a method and path are replayed in their recorded order,
+    starting over once all were used, each after its recorded latency divided
+    by the speed; a speed of 0 answers right away. A request never recorded
+    is answered as not supported.
+    """
+
+    def __init__(self, exchanges, speed=1.0):
+        """Initialize the replay of recorded exchanges."""
+        self._answers = defaultdict(list)
+        for _, duration, method, path, _, outcome, answer in exchanges:
+            self._answers[(method, path)].append((duration, outcome, answer))
+        self._speed = speed
+        self._next = Counter()
+        self.requests = 0
+
+    async def __call__(self, method, path, payload=None):
+        """Answer a request as it was recorded."""
+        self.requests += 1
+        answers = self._answers.get((method, path))
+        if not answers:
+            raise myComfortNotSupportedError(f"{method} {path} was not recorded")
+        duration, outcome, answer = answers[self._next[(method, path)] % len(answers)]
+        self._next[(method, path)] += 1
+        if self._speed:
+            await asyncio.sleep(duration / self._speed)
+        if outcome != "ok":
+            raise RECORDED_ERRORS[outcome](answer)
+        return answer
@@ -1,19 +1,29 @@
 """Windhager myComfort water_heater device."""
 import logging
 
-import requests
-
 from homeassistant.components.water_heater import (
+    ATTR_CURRENT_TEMPERATURE,
     SUPPORT_TARGET_TEMPERATURE,
     WaterHeaterEntity,
 )
-from homeassistant.const import ATTR_TEMPERATURE, PRECISION_TENTHS, TEMP_CELSIUS
+from homeassistant.const import (
+    ATTR_TEMPERATURE,
+    PRECISION_TENTHS,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    TEMP_CELSIUS,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import (
+    ATTR_RESTORED,
     DOMAIN as MYCOMFORT_DOMAIN,
-    MYCOMFORT_ERROR,
-    MYCOMFORT_API,
+    MYCOMFORT_COORDINATOR,
     MYCOMFORT_NAME,
+    SIGNAL_NEW_DEVICES,
 )
 
 logger = logging.getLogger(__name__)
@@ -32,6 +42,13 @@ MYCOMFORT_MODE_HEATING = "Heating mode"
 MYCOMFORT_MODE_SETBACK = "Setback mode"
 MYCOMFORT_MODE_DHW = "DHW operation"
 
+# Datapoints shown by a water_heater entity
+MYCOMFORT_WATER_DATAPOINTS = [
+    "getDHWTemperature",
+    "getDHWSetpointTemperature",
+    "getOperationMode",
+]
+
 MYCOMFORT_TEMP_WATER_MIN = 10
 MYCOMFORT_TEMP_WATER_MAX = 60
 
@@ -55,29 +72,39 @@ HA_TO_MYCOMFORT_HVAC_DHW = {
 }
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Create the Windhager myComfort water_heater devices."""
     if discovery_info is None:
         return
-    mycomfort_api = hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_API]
-
-    for module in mycomfort_api.modules():
-        if module.isDHWCircuit():
-            add_entities(
-                [
-                    myComfortWater(
-                        f"{hass.data[MYCOMFORT_DOMAIN][MYCOMFORT_NAME]} Water",
-                        module,
-                    )
-                ]
-            )
-
-
-class myComfortWater(WaterHeaterEntity):
+    gateway = hass.data[MYCOMFORT_DOMAIN][discovery_info[MYCOMFORT_NAME]]
+    coordinator = gateway[MYCOMFORT_COORDINATOR]
+    name = gateway[MYCOMFORT_NAME]
+
+    @callback
+    def async_add_devices(boilers, modules):
+        """Add the water_heater devices of DHW circuits."""
+        async_add_entities(
+            [
+                myComfortWater(
+                    f"{name} Water",
+                    coordinator,
+                    module,
+                )
+                for module in modules
+                if module.isDHWCircuit()
+            ]
+        )
+
+    async_add_devices(coordinator.boilers, coordinator.modules)
+    async_dispatcher_connect(hass, SIGNAL_NEW_DEVICES.format(name), async_add_devices)
+
+
+class myComfortWater(CoordinatorEntity, RestoreEntity, WaterHeaterEntity):
     """Representation of the Windhager myComfort domestic hot water device."""
 
-    def __init__(self, name, api):
+    def __init__(self, name, coordinator, api):
         """Initialize the DHW water_heater device."""
+        super().__init__(coordinator)
         self._name = name
         self._state = None
         self._api = api
@@ -85,24 +112,79 @@ class myComfortWater(WaterHeaterEntity):
         self._target_temperature = None
         self._current_temperature = None
         self._current_mode = None
-
-    def update(self):
-        try:
-            current_temperature = float(self._api.getDHWTemperature())
-            if current_temperature != MYCOMFORT_ERROR:
-                self._current_temperature = current_temperature
-            else:
-                self._current_temperature = None
-
-            self._target_temperature = (
-                float(self._api.getDHWSetpointTemperature())
+        self._snapshot = None
+        self._restored = False
+        self._published = None
+
+    async def async_added_to_hass(self):
+        """Add the datapoints to the fetch plan and read the current snapshot."""
+        await super().async_added_to_hass()
+        self._update_from_snapshot()
+        if self._current_mode is None:
+            await self._async_restore()
+        self.async_on_remove(
+            self.coordinator.async_want(
+                self._api,
+                MYCOMFORT_WATER_DATAPOINTS,
+                self._restored,
+                interactive=True,
             )
+        )
+        self._published = self._published_state()
+
+    async def _async_restore(self):
+        """Show the state saved before the restart until the first fetch."""
+        last_state = await self.async_get_last_state()
+        if last_state is None or last_state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return
+        self._current_temperature = last_state.attributes.get(ATTR_CURRENT_TEMPERATURE)
+        self._target_temperature = last_state.attributes.get(ATTR_TEMPERATURE)
+        self._current_mode = HA_TO_MYCOMFORT_HVAC_DHW.get(last_state.state)
+        self._restored = True
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Publish the coordinator snapshot if anything shown changed."""
+        self._update_from_snapshot()
+        published = self._published_state()
+        if published != self._published:
+            self._published = published
+            self.async_write_ha_state()
+
+    def _published_state(self):
+        """Return the values shown by the entity."""
+        return (
+            self.coordinator.available(self._api),
+            self._current_temperature,
+            self._target_temperature,
+            self._current_mode,
+            self._restored,
+        )
+
+    def _update_from_snapshot(self):
+        data = self.coordinator.snapshot(self._api)
+        # Snapshots are decoded once and only replaced when a value changed
+        if data is self._snapshot:
+            return
+        if not self.coordinator.fetched(self._api, MYCOMFORT_WATER_DATAPOINTS):
+            logger.debug("No data from myComfort gateway yet for %s", self._name)
+            return
+        self._snapshot = data
+        # The temperature of a failed sensor is None
+        self._current_temperature = data.get("getDHWTemperature")
+        self._target_temperature = data.get("getDHWSetpointTemperature")
+        self._current_mode = data.get("getOperationMode")
+        self._restored = False
 
-            self._current_mode = self._api.getOperationMode()
-        except requests.exceptions.ConnectionError:
-            logger.error("Unable to retrieve data from myComfort gateway")
-        except ValueError:
-            logger.error("Unable to decode data from myComfort gateway")
+    @property
+    def extra_state_attributes(self):
+        """Flag a state restored from before the restart."""
+        return {ATTR_RESTORED: True} if self._restored else None
+
+    @property
+    def available(self):
+        """Return True unless the gateway or the module failed too many times."""
+        return self.coordinator.available(self._api)
 
     @property
     def supported_features(self):
@@ -135,6 +217,8 @@ class myComfortWater(WaterHeaterEntity):
         if temp is not None:
             #self._api.setDomesticHotWaterTemperature(temp)
             self._target_temperature = temp
+            # Not written, the next update shows the gateway setpoint again
+            self._snapshot = None
 
     @property
     def min_temp(self):